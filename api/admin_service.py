@@ -9,7 +9,7 @@ import secrets
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Iterable
 
 from api.admin_security import decrypt_secret, encrypt_secret, hash_password, verify_password
 from api.database import get_connection, init_db
@@ -155,6 +155,19 @@ class AdminAuthService:
             row = conn.execute("SELECT * FROM admin_users WHERE id = ?", (admin_id,)).fetchone()
             return dict(row) if row else None
 
+    def get_admins(self, admin_ids: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """Fetch several admins in one query, keyed by id. Unknown ids are omitted."""
+        ids = list(dict.fromkeys(admin_ids))
+        if not ids:
+            return {}
+        placeholders = ",".join("?" for _ in ids)
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM admin_users WHERE id IN ({placeholders})",
+                ids,
+            ).fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
     @staticmethod
     def _parse_ts(raw: Any) -> datetime | None:
         if not raw:
@@ -4,12 +4,13 @@ Apps / HTML distribution management service.
 
 from __future__ import annotations
 
+import os
 import re
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import IO, Any, Callable
 
 from api.database import get_connection, init_db
 
@@ -36,6 +37,7 @@ class AppsService:
         init_db()
         self._base_dir = base_dir or Path(__file__).resolve().parent.parent / "data" / "apps"
         self._base_dir.mkdir(parents=True, exist_ok=True)
+        self._stat_cache: dict[str, os.stat_result] = {}
 
     def list_latest(self) -> list[AppAsset]:
         with get_connection() as conn:
@@ -70,6 +72,54 @@ class AppsService:
         content: bytes,
         admin_id: str,
         updated_by_label: str,
+    ) -> AppAsset:
+        return self._store_upload(
+            app_key=app_key,
+            app_name=app_name,
+            filename=filename,
+            admin_id=admin_id,
+            updated_by_label=updated_by_label,
+            write=lambda path: path.write_bytes(content),
+        )
+
+    def open_staging_file(self) -> IO[bytes]:
+        """
+        Temporary file for an incoming upload. It lives under the storage directory so
+        save_upload_from_path can move it into place with a rename instead of a copy.
+        """
+        # Opened like any other file (not via mkstemp's 0600), so the current umask decides
+        # the mode the stored file ends up with.
+        return open(self._base_dir / f"{uuid.uuid4().hex}.upload", "xb")
+
+    def save_upload_from_path(
+        self,
+        *,
+        app_key: str,
+        app_name: str,
+        filename: str,
+        source_path: str,
+        admin_id: str,
+        updated_by_label: str,
+    ) -> AppAsset:
+        """Like save_upload, but moves an already-written file (see open_staging_file) into storage."""
+        return self._store_upload(
+            app_key=app_key,
+            app_name=app_name,
+            filename=filename,
+            admin_id=admin_id,
+            updated_by_label=updated_by_label,
+            write=lambda path: os.replace(source_path, path),
+        )
+
+    def _store_upload(
+        self,
+        *,
+        app_key: str,
+        app_name: str,
+        filename: str,
+        admin_id: str,
+        updated_by_label: str,
+        write: Callable[[Path], Any],
     ) -> AppAsset:
         if not APP_KEY_RE.match(app_key):
             raise ValueError("Invalid app_key")
@@ -80,7 +130,7 @@ class AppsService:
         storage_dir = self._base_dir / app_key / asset_id
         storage_dir.mkdir(parents=True, exist_ok=True)
         storage_path = storage_dir / filename
-        storage_path.write_bytes(content)
+        write(storage_path)
         with get_connection() as conn:
             conn.execute(
                 "UPDATE app_html_assets SET is_latest = 0 WHERE app_key = ?",
@@ -119,6 +169,17 @@ class AppsService:
             is_latest=True,
         )
 
+    def file_stat(self, asset: AppAsset) -> os.stat_result:
+        """
+        Stat an asset's file once. Every upload gets its own directory and files are never
+        rewritten in place, so the (size, mtime) seen first stays valid.
+        """
+        cached = self._stat_cache.get(asset.storage_path)
+        if cached is None:
+            cached = os.stat(asset.storage_path)
+            self._stat_cache[asset.storage_path] = cached
+        return cached
+
     def _next_version_number(self, app_key: str) -> int:
         with get_connection() as conn:
             row = conn.execute(
@@ -363,6 +363,14 @@ def init_db() -> None:
             );
             """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS latest_pointer (
+                table_name TEXT PRIMARY KEY,
+                id TEXT NOT NULL
+            );
+            """
+        )
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS admin_audit_logs (
@@ -393,6 +401,12 @@ def init_db() -> None:
             ON app_html_assets(app_key, is_latest);
             """
         )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_wifi_updated
+            ON wifi_local_datasets(datetime(updated_at) DESC, created_at DESC);
+            """
+        )
         conn.execute(
             """
             CREATE INDEX IF NOT EXISTS idx_link_issues_child_key
@@ -11,7 +11,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         target_code = req_body.get('target_code')
         record = service.deactivate_code(actor_code, target_code)
         return func.HttpResponse(
-            json.dumps({"id": record["id"], "is_active": bool(record["is_active"])}),
+            json.dumps({"id": record.id, "is_active": bool(record.is_active)}),
             mimetype="application/json",
             status_code=200
         )
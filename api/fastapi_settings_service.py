@@ -6,12 +6,24 @@ from __future__ import annotations
 
 import json
 import secrets
+import time
 import uuid
 from datetime import datetime, timezone
 from typing import Any
 
 from api.admin_security import decrypt_secret, encrypt_secret
 from api.database import get_connection, init_db
+from api.network_utils import compile_cidrs
+
+SETTINGS_CACHE_TTL_SECONDS = 5.0
+
+# (expires_at on the monotonic clock, settings); shared by all service instances.
+_settings_cache: tuple[float, dict[str, Any]] | None = None
+
+
+def invalidate_settings_cache() -> None:
+    global _settings_cache
+    _settings_cache = None
 
 
 class FastApiSettingsService:
@@ -19,6 +31,18 @@ class FastApiSettingsService:
         init_db()
 
     def get_settings(self) -> dict[str, Any]:
+        global _settings_cache
+        now = time.monotonic()
+        cached = _settings_cache
+        if cached is not None and cached[0] > now:
+            return dict(cached[1])
+        settings = self._load_settings()
+        # Parsed once per load so request-time checks only compare integers.
+        settings["allowed_networks"] = compile_cidrs(settings["allowed_cidr_list"])
+        _settings_cache = (now + SETTINGS_CACHE_TTL_SECONDS, settings)
+        return dict(settings)
+
+    def _load_settings(self) -> dict[str, Any]:
         with get_connection() as conn:
             row = conn.execute(
                 "SELECT * FROM fastapi_settings ORDER BY updated_at DESC LIMIT 1"
@@ -88,6 +112,7 @@ class FastApiSettingsService:
                     ),
                 )
             conn.commit()
+        invalidate_settings_cache()
         return self.get_settings()
 
     def regenerate_token(self) -> str:
@@ -11,7 +11,7 @@ import json
 import os
 import secrets
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 import jwt
@@ -56,14 +56,57 @@ def verify_qr_token(token: str, *, secret: str) -> dict[str, Any]:
     return payload
 
 
+class Session(dict):
+    """Decoded session data that records whether a handler changed it."""
+
+    dirty: bool = False
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.dirty = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.dirty = True
+        super().__delitem__(key)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in self:
+            self.dirty = True
+        return super().pop(key, *default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self.dirty = True
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self.dirty = True
+        super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self.dirty = True
+        super().clear()
+
+    def popitem(self) -> tuple[str, Any]:
+        self.dirty = True
+        return super().popitem()
+
+
 @dataclass
 class SessionManager:
     secret: str
     cookie_name: str = "guardian_session"
     max_age_seconds: int = 8 * 60 * 60
+    _hmac: Any = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Keyed once; copies skip re-deriving the inner/outer pads on every cookie.
+        self._hmac = hmac.new(self.secret.encode("utf-8"), digestmod=hashlib.sha256)
 
     def _sign(self, payload: bytes) -> str:
-        return _base64url(hmac.new(self.secret.encode("utf-8"), payload, hashlib.sha256).digest())
+        mac = self._hmac.copy()
+        mac.update(payload)
+        return _base64url(mac.digest())
 
     def encode(self, data: dict[str, Any]) -> str:
         now = int(time.time())
@@ -73,23 +116,29 @@ class SessionManager:
         signature = self._sign(payload)
         return f"{payload_b64}.{signature}"
 
-    def decode(self, raw: str | None) -> dict[str, Any]:
+    def decode(self, raw: str | None) -> Session:
         if not raw:
-            return {}
+            return Session()
         try:
             payload_b64, sig = raw.split(".", 1)
         except ValueError:
-            return {}
-        expected_sig = self._sign(_base64url_decode(payload_b64))
-        if not hmac.compare_digest(expected_sig, sig):
-            return {}
+            return Session()
+        try:
+            payload_raw = _base64url_decode(payload_b64)
+        except ValueError:
+            return Session()
+        expected_sig = self._sign(payload_raw)
+        # Bytes, so a non-ASCII cookie fails the check instead of raising TypeError.
+        if not hmac.compare_digest(expected_sig.encode("ascii"), sig.encode("utf-8")):
+            return Session()
         try:
-            payload = json.loads(_base64url_decode(payload_b64))
+            payload = json.loads(payload_raw)
         except json.JSONDecodeError:
-            return {}
+            return Session()
         if int(payload.get("exp", 0)) < int(time.time()):
-            return {}
-        return payload.get("data", {})
+            return Session()
+        data = payload.get("data")
+        return Session(data) if isinstance(data, dict) else Session()
 
 
 class M365OIDCClient:
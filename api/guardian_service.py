@@ -272,6 +272,37 @@ class GuardianService:
             ).fetchall()
         return [dict(row) for row in rows]
 
+    def get_children_masked(self, user_id: str) -> list[dict]:
+        """Linked children with the label already masked, so only the masked text leaves SQLite."""
+        # Same rule as _mask_label: first character, '*', then the last one for labels over
+        # two characters; NULLIF mirrors Python's `or` treating empty strings as missing.
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT child_id,
+                       CASE
+                           WHEN label IS NULL OR label = '' THEN '園児'
+                           WHEN length(label) <= 2 THEN substr(label, 1, 1) || '*'
+                           ELSE substr(label, 1, 1) || '*' || substr(label, -1, 1)
+                       END AS display_label_masked
+                FROM (
+                    SELECT gl.child_id,
+                           gl.created_at,
+                           COALESCE(
+                               NULLIF(c.display_label, ''),
+                               NULLIF(c.external_child_id, ''),
+                               gl.child_id
+                           ) AS label
+                    FROM guardian_links gl
+                    LEFT JOIN children c ON c.id = gl.child_id
+                    WHERE gl.user_id = ? AND gl.is_active = 1
+                )
+                ORDER BY created_at DESC
+                """,
+                (user_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
     def get_thread_by_child(self, child_id: str) -> dict | None:
         with get_connection() as conn:
             row = conn.execute(
@@ -352,18 +383,72 @@ class GuardianService:
         return dict(row)
 
     def mark_read(self, *, thread_id: str, reader_type: str, reader_id: str) -> None:
+        with get_connection() as conn:
+            self._mark_read(conn, thread_id, reader_type, reader_id)
+
+    @staticmethod
+    def _mark_read(conn, thread_id: str, reader_type: str, reader_id: str) -> None:
         read_id = str(uuid.uuid4())
         now = dt.datetime.utcnow().isoformat(sep=" ", timespec="seconds")
+        conn.execute(
+            """
+            INSERT INTO notification_reads (id, thread_id, reader_type, reader_id, last_read_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(thread_id, reader_type, reader_id) DO UPDATE SET
+                last_read_at = excluded.last_read_at
+            """,
+            (read_id, thread_id, reader_type, reader_id, now),
+        )
+
+    def load_thread_view(
+        self,
+        thread_id: str,
+        *,
+        reader_type: str,
+        reader_id: str,
+        link_user_id: str | None = None,
+        unread_sender_types: Iterable[str] | None = None,
+    ) -> dict | None:
+        """
+        Load everything a thread page needs in one connection and transaction: the thread,
+        the reader's active link (when link_user_id is given), the unread count before this
+        visit (when unread_sender_types is given), then mark it read and list the messages.
+        Returns None for an unknown thread, and stops with link=None when the link is missing.
+        """
         with get_connection() as conn:
-            conn.execute(
+            row = conn.execute(
+                "SELECT * FROM notification_threads WHERE id = ?",
+                (thread_id,),
+            ).fetchone()
+            if not row:
+                return None
+            view: dict = {"thread": dict(row), "link": None, "unread": None, "messages": []}
+            if link_user_id is not None:
+                link = conn.execute(
+                    """
+                    SELECT * FROM guardian_links
+                    WHERE user_id = ? AND child_id = ? AND is_active = 1
+                    """,
+                    (link_user_id, row["child_id"]),
+                ).fetchone()
+                if not link:
+                    return view
+                view["link"] = dict(link)
+            if unread_sender_types is not None:
+                view["unread"] = self._count_unread(
+                    conn, thread_id, reader_type, reader_id, unread_sender_types
+                )
+            self._mark_read(conn, thread_id, reader_type, reader_id)
+            messages = conn.execute(
                 """
-                INSERT INTO notification_reads (id, thread_id, reader_type, reader_id, last_read_at)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(thread_id, reader_type, reader_id) DO UPDATE SET
-                    last_read_at = excluded.last_read_at
+                SELECT * FROM notification_messages
+                WHERE thread_id = ?
+                ORDER BY created_at ASC
                 """,
-                (read_id, thread_id, reader_type, reader_id, now),
-            )
+                (thread_id,),
+            ).fetchall()
+        view["messages"] = [dict(message) for message in messages]
+        return view
 
     def get_last_read_at(
         self, *, thread_id: str, reader_type: str, reader_id: str
@@ -389,9 +474,22 @@ class GuardianService:
         reader_id: str,
         sender_types: Iterable[str],
     ) -> int:
-        last_read = self.get_last_read_at(
-            thread_id=thread_id, reader_type=reader_type, reader_id=reader_id
-        )
+        with get_connection() as conn:
+            return self._count_unread(conn, thread_id, reader_type, reader_id, sender_types)
+
+    @staticmethod
+    def _count_unread(
+        conn, thread_id: str, reader_type: str, reader_id: str, sender_types: Iterable[str]
+    ) -> int:
+        sender_types = list(sender_types)
+        read_row = conn.execute(
+            """
+            SELECT last_read_at
+            FROM notification_reads
+            WHERE thread_id = ? AND reader_type = ? AND reader_id = ?
+            """,
+            (thread_id, reader_type, reader_id),
+        ).fetchone()
         sender_placeholders = ",".join("?" for _ in sender_types)
         params: list = [thread_id, *sender_types]
         query = f"""
@@ -400,11 +498,10 @@ class GuardianService:
             WHERE thread_id = ?
               AND sender_type IN ({sender_placeholders})
         """
-        if last_read:
+        if read_row:
             query += " AND created_at > ?"
-            params.append(last_read.isoformat())
-        with get_connection() as conn:
-            row = conn.execute(query, params).fetchone()
+            params.append(dt.datetime.fromisoformat(read_row["last_read_at"]).isoformat())
+        row = conn.execute(query, params).fetchone()
         return int(row["count"]) if row else 0
 
     def get_last_message_at(self, thread_id: str) -> str | None:
@@ -10,8 +10,8 @@ from api.line_messaging import (
     build_statement_flex,
     get_line_users_for_child,
     push_message,
-    record_message_delivery,
-    record_statement_delivery,
+    record_message_delivery_bulk,
+    record_statement_delivery_bulk,
 )
 
 
@@ -94,28 +94,38 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     else:
         return _json_response({"detail": "Invalid message_type."}, status_code=400)
 
+    message_rows = []
+    statement_rows = []
     for line_user_id in line_user_ids:
         status = "sent"
         try:
             push_message(line_user_id, messages)
         except LineMessagingRequestError:
             status = "failed"
-        record_message_delivery(
-            message_type=message_type,
-            child_key=str(child_key),
-            line_user_id=line_user_id,
-            status=status,
-            payload=message_payload,
-            statement_id=statement_id,
-            event_id=event_id,
+        message_rows.append(
+            {
+                "message_type": message_type,
+                "child_key": str(child_key),
+                "line_user_id": line_user_id,
+                "status": status,
+                "payload": message_payload,
+                "statement_id": statement_id,
+                "event_id": event_id,
+            }
         )
         if message_type == "statement":
-            record_statement_delivery(
-                statement_id=str(statement_id),
-                child_key=str(child_key),
-                line_user_id=line_user_id,
-                status=status,
+            statement_rows.append(
+                {
+                    "statement_id": str(statement_id),
+                    "child_key": str(child_key),
+                    "line_user_id": line_user_id,
+                    "status": status,
+                }
             )
         results.append({"line_user_id": line_user_id, "status": status})
 
+    record_message_delivery_bulk(message_rows)
+    if statement_rows:
+        record_statement_delivery_bulk(statement_rows)
+
     return _json_response({"ok": True, "results": results})
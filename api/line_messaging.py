@@ -5,16 +5,19 @@ LINE Messaging API helpers for webhook handling and push delivery.
 from __future__ import annotations
 
 import base64
+import binascii
 import hashlib
 import hmac
 import json
 import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Iterable
 from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
+import httpx
+
 from api.database import get_connection, init_db
 
 
@@ -53,8 +56,11 @@ def verify_signature(body: bytes, signature: str, channel_secret: str) -> bool:
     if not signature:
         return False
     mac = hmac.new(channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
-    expected = base64.b64encode(mac).decode("utf-8")
-    return hmac.compare_digest(expected, signature)
+    try:
+        provided = base64.b64decode(signature, validate=True)
+    except (binascii.Error, ValueError):
+        return False
+    return hmac.compare_digest(provided, mac)
 
 
 def _line_headers(channel_access_token: str) -> dict[str, str]:
@@ -79,16 +85,50 @@ def _post_line(url: str, payload: dict[str, Any]) -> dict[str, Any]:
         raise LineMessagingRequestError(f"LINE API request failed: {status}")
 
 
+async def _post_line_async(
+    client: httpx.AsyncClient, url: str, payload: dict[str, Any]
+) -> dict[str, Any]:
+    channel_access_token = _require_env("LINE_CHANNEL_ACCESS_TOKEN")
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    try:
+        response = await client.post(
+            url, content=data, headers=_line_headers(channel_access_token), timeout=10
+        )
+    except httpx.RequestError:
+        raise LineMessagingRequestError("LINE API request failed: None")
+    if response.is_error:
+        raise LineMessagingRequestError(f"LINE API request failed: {response.status_code}")
+    if not response.content:
+        return {}
+    return response.json()
+
+
 def reply_message(reply_token: str, messages: list[dict[str, Any]]) -> None:
     if not reply_token:
         return
     _post_line(LINE_REPLY_ENDPOINT, {"replyToken": reply_token, "messages": messages})
 
 
+async def reply_message_async(
+    client: httpx.AsyncClient, reply_token: str, messages: list[dict[str, Any]]
+) -> None:
+    if not reply_token:
+        return
+    await _post_line_async(
+        client, LINE_REPLY_ENDPOINT, {"replyToken": reply_token, "messages": messages}
+    )
+
+
 def push_message(line_user_id: str, messages: list[dict[str, Any]]) -> None:
     _post_line(LINE_PUSH_ENDPOINT, {"to": line_user_id, "messages": messages})
 
 
+async def push_message_async(
+    client: httpx.AsyncClient, line_user_id: str, messages: list[dict[str, Any]]
+) -> None:
+    await _post_line_async(client, LINE_PUSH_ENDPOINT, {"to": line_user_id, "messages": messages})
+
+
 @dataclass(frozen=True)
 class StatementPayload:
     statement_id: str
@@ -298,6 +338,58 @@ def record_message_delivery(
         conn.commit()
 
 
+def record_statement_delivery_bulk(rows: Iterable[dict[str, Any]]) -> None:
+    """Insert many statement delivery rows in a single transaction."""
+    sent_at = _isoformat(_utcnow())
+    params = [
+        (row["statement_id"], row["child_key"], row["line_user_id"], row["status"], sent_at)
+        for row in rows
+    ]
+    if not params:
+        return
+    init_line_db()
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO line_statement_messages (statement_id, child_key, line_user_id, status, sent_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            params,
+        )
+        conn.commit()
+
+
+def record_message_delivery_bulk(rows: Iterable[dict[str, Any]]) -> None:
+    """Insert many message delivery rows in a single transaction."""
+    sent_at = _isoformat(_utcnow())
+    params = [
+        (
+            row["message_type"],
+            row.get("child_key"),
+            row["line_user_id"],
+            row["status"],
+            json.dumps(row["payload"], ensure_ascii=False),
+            row.get("statement_id"),
+            row.get("event_id"),
+            sent_at,
+        )
+        for row in rows
+    ]
+    if not params:
+        return
+    init_line_db()
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO line_message_deliveries (
+                message_type, child_key, line_user_id, status, payload, statement_id, event_id, sent_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            params,
+        )
+        conn.commit()
+
+
 def mark_comment_request(line_user_id: str, statement_id: str) -> None:
     init_line_db()
     with get_connection() as conn:
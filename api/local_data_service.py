@@ -5,13 +5,50 @@ Local Wi-Fi data storage service for latest/history datasets.
 from __future__ import annotations
 
 import json
+import re
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any
 
+import orjson
+
 from api.database import get_connection, init_db
 
+LATEST_QUERY = """
+    SELECT id, version_label, updated_at, updated_by, payload_json
+    FROM wifi_local_datasets
+    WHERE id = (SELECT id FROM latest_pointer WHERE table_name = 'wifi_local_datasets')
+"""
+LATEST_VERSION_QUERY = """
+    SELECT id, updated_at
+    FROM wifi_local_datasets
+    WHERE id = (SELECT id FROM latest_pointer WHERE table_name = 'wifi_local_datasets')
+"""
+
+# orjson only handles 64-bit integers: it refuses wider ones when encoding and silently
+# turns them into floats when decoding. Any run of 20+ digits might be one, so those
+# payloads go through the json module instead.
+_WIDE_INT_RE = re.compile(rb"\d{20}")
+
+
+def _dump_payload(payload: Any) -> bytes:
+    try:
+        return orjson.dumps(payload)
+    except orjson.JSONEncodeError:
+        return json.dumps(payload).encode("utf-8")
+
+
+def _load_payload(raw: bytes | str) -> Any:
+    data = raw.encode("utf-8") if isinstance(raw, str) else raw
+    if _WIDE_INT_RE.search(data) is None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Legacy rows written by json.dumps may hold NaN/Infinity, which orjson rejects.
+            pass
+    return json.loads(data)
+
 
 @dataclass(frozen=True)
 class LocalDatasetRecord:
@@ -22,25 +59,68 @@ class LocalDatasetRecord:
     payload: Any
 
 
+@dataclass(frozen=True)
+class RawLocalDataset:
+    """A dataset whose payload is left as the stored JSON bytes."""
+
+    id: str
+    version_label: str
+    updated_at: str
+    updated_by: str
+    payload_json: bytes
+
+
 class LocalDatasetService:
     def __init__(self) -> None:
         init_db()
+        self._backfill_latest_pointer()
 
     def get_latest(self) -> LocalDatasetRecord | None:
+        row = self._fetch_latest_row()
+        return self._hydrate(row) if row else None
+
+    def get_latest_version(self) -> tuple[str, str] | None:
+        """(id, updated_at) of the latest dataset, without reading its payload."""
+        row = self._fetch_latest_row(LATEST_VERSION_QUERY)
+        return (row["id"], row["updated_at"]) if row else None
+
+    def get_latest_raw(self) -> RawLocalDataset | None:
+        """Latest dataset without decoding its payload, for writing straight to a response."""
+        row = self._fetch_latest_row()
+        if row is None:
+            return None
+        raw = row["payload_json"]
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        return RawLocalDataset(
+            id=row["id"],
+            version_label=row["version_label"],
+            updated_at=row["updated_at"],
+            updated_by=row["updated_by"],
+            payload_json=raw or b"null",
+        )
+
+    def _fetch_latest_row(self, query: str = LATEST_QUERY) -> Any:
         with get_connection() as conn:
-            row = conn.execute(
-                """
-                SELECT id, version_label, updated_at, updated_by, payload_json
-                FROM wifi_local_datasets
-                ORDER BY datetime(updated_at) DESC, created_at DESC
-                LIMIT 1
-                """
+            return conn.execute(query).fetchone()
+
+    def _backfill_latest_pointer(self) -> None:
+        # Rows saved before latest_pointer existed: point at the newest one once, here,
+        # so reads never have to write. Later saves keep the pointer current.
+        with get_connection() as conn:
+            has_pointer = conn.execute(
+                "SELECT 1 FROM latest_pointer WHERE table_name = 'wifi_local_datasets'"
             ).fetchone()
-        return self._hydrate(row) if row else None
+            if has_pointer is None:
+                self._refresh_latest_pointer(conn)
+                conn.commit()
 
-    def list_history(self, limit: int | None = None) -> list[LocalDatasetRecord]:
+    def list_history(
+        self, limit: int | None = None, *, with_payload: bool = True
+    ) -> list[LocalDatasetRecord]:
+        payload_column = "payload_json" if with_payload else "NULL AS payload_json"
         query = (
-            "SELECT id, version_label, updated_at, updated_by, payload_json "
+            f"SELECT id, version_label, updated_at, updated_by, {payload_column} "
             "FROM wifi_local_datasets ORDER BY datetime(updated_at) DESC, created_at DESC"
         )
         params: tuple[Any, ...] = ()
@@ -74,9 +154,10 @@ class LocalDatasetService:
                     version_label,
                     record_updated_at,
                     updated_by,
-                    json.dumps(payload, ensure_ascii=False),
+                    _dump_payload(payload),
                 ),
             )
+            self._refresh_latest_pointer(conn)
             conn.commit()
         return LocalDatasetRecord(
             id=record_id,
@@ -86,12 +167,65 @@ class LocalDatasetService:
             payload=payload,
         )
 
+    def save_datasets_bulk(self, items: list[dict[str, Any]]) -> list[LocalDatasetRecord]:
+        """Insert several datasets in one transaction (one commit instead of one per item)."""
+        now = datetime.now(timezone.utc).isoformat()
+        records = [
+            LocalDatasetRecord(
+                id=str(uuid.uuid4()),
+                version_label=item["version_label"],
+                updated_at=item.get("updated_at") or now,
+                updated_by=item["updated_by"],
+                payload=item.get("payload"),
+            )
+            for item in items
+        ]
+        if not records:
+            return []
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO wifi_local_datasets (
+                    id, version_label, updated_at, updated_by, payload_json
+                ) VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        record.id,
+                        record.version_label,
+                        record.updated_at,
+                        record.updated_by,
+                        _dump_payload(record.payload),
+                    )
+                    for record in records
+                ],
+            )
+            self._refresh_latest_pointer(conn)
+            conn.commit()
+        return records
+
+    @staticmethod
+    def _refresh_latest_pointer(conn: Any) -> None:
+        # updated_at may be supplied by the client (e.g. /sync of older data), so the
+        # pointer follows the same ordering as list_history rather than insert order.
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO latest_pointer (table_name, id)
+            SELECT 'wifi_local_datasets', id
+            FROM wifi_local_datasets
+            ORDER BY datetime(updated_at) DESC, created_at DESC
+            LIMIT 1
+            """
+        )
+
     @staticmethod
     def _hydrate(row: Any) -> LocalDatasetRecord:
+        # payload_json holds UTF-8 bytes for new rows and str for legacy rows.
+        raw = row["payload_json"]
         return LocalDatasetRecord(
             id=row["id"],
             version_label=row["version_label"],
             updated_at=row["updated_at"],
             updated_by=row["updated_by"],
-            payload=json.loads(row["payload_json"] or "null"),
+            payload=_load_payload(raw) if raw else None,
         )
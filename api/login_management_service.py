@@ -18,8 +18,17 @@ class LoginManagementService:
     def get_entries(self) -> list[dict[str, Any]]:
         with get_connection() as conn:
             row = conn.execute(
-                "SELECT payload_json FROM login_management_settings ORDER BY updated_at DESC LIMIT 1"
+                """
+                SELECT payload_json FROM login_management_settings
+                WHERE id = (
+                    SELECT id FROM latest_pointer WHERE table_name = 'login_management_settings'
+                )
+                """
             ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    "SELECT payload_json FROM login_management_settings ORDER BY updated_at DESC LIMIT 1"
+                ).fetchone()
         if not row:
             return []
         try:
@@ -53,5 +62,12 @@ class LoginManagementService:
                     """,
                     (record_id, payload_json, admin_id),
                 )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO latest_pointer (table_name, id)
+                VALUES ('login_management_settings', ?)
+                """,
+                (record_id,),
+            )
             conn.commit()
         return self.get_entries()
@@ -4,17 +4,53 @@ Core business logic for issuing, validating, and revoking management codes.
 
 from __future__ import annotations
 
+import hashlib
 import secrets
 import string
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Any, Optional
 
 from api.database import get_connection, init_db
-from api.security import fingerprint, hash_code, verify_code
+from api.security import fingerprint, hash_code, verify_code, verify_code_async
 
 ALLOWED_CHARS = string.ascii_letters + string.digits + "-"
 MIN_LENGTH = 8
 MAX_LENGTH = 16
 
+# bytes.translate(None, delete) strips these in one C-level pass; whatever survives is rejected.
+_ALLOWED_BYTES = ALLOWED_CHARS.encode("ascii")
+_LETTER_BYTES = string.ascii_letters.encode("ascii")
+_DIGIT_BYTES = string.digits.encode("ascii")
+
+# Only the columns the service reads; code_fingerprint is UNIQUE, so this is an index lookup.
+ACTIVE_CODE_QUERY = (
+    "SELECT id, code_salt, code_hash, is_active, role "
+    "FROM management_codes WHERE code_fingerprint = ? LIMIT 1"
+)
+STORED_CODE_QUERY = (
+    "SELECT id, role, created_by, created_at, is_active FROM management_codes WHERE id = ?"
+)
+
+
+VALIDATE_CACHE_MAXSIZE = 4096
+# Bounds how long another process's deactivation can go unnoticed here.
+VALIDATE_CACHE_TTL_SECONDS = 30.0
+
+
+@dataclass(slots=True, frozen=True)
+class CodeRecord:
+    """A validated management code; field order matches ACTIVE_CODE_QUERY."""
+
+    id: int
+    code_salt: str = field(repr=False)
+    code_hash: str = field(repr=False)
+    is_active: int
+    role: str
+
 
 class ManagementCodeError(Exception):
     """Base class for management code errors."""
@@ -28,6 +64,25 @@ class InvalidCode(ManagementCodeError):
     """Raised when a provided code is invalid or inactive."""
 
 
+# blake2b(code) -> (expires_at on the monotonic clock, CodeRecord or InvalidCode message).
+_validate_cache: OrderedDict[bytes, tuple[float, CodeRecord | str]] = OrderedDict()
+_validate_cache_lock = threading.Lock()
+# Bumped by every invalidation; a lookup that started under an older generation may have
+# read the row before the change, so its result is not cached.
+_validate_cache_generation = 0
+
+
+def _validate_cache_key(code: str) -> bytes:
+    return hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+
+
+def invalidate_validate_cache() -> None:
+    global _validate_cache_generation
+    with _validate_cache_lock:
+        _validate_cache_generation += 1
+        _validate_cache.clear()
+
+
 class ManagementCodeService:
     """Service layer for management code operations."""
 
@@ -47,33 +102,89 @@ class ManagementCodeService:
             if existing:
                 raise ManagementCodeError("Master admin code already exists.")
             record = self._store_code(conn, code, role="master_admin", created_by=None)
-            return record
+        invalidate_validate_cache()
+        return record
 
     def issue_admin_code(self, issuer_code: str) -> dict:
         """Issue a new admin code after validating the issuer as master_admin."""
         issuer = self._validate_active_code(issuer_code, required_role="master_admin")
         new_code = self._generate_unique_code()
         with get_connection() as conn:
-            record = self._store_code(conn, new_code, role="admin", created_by=issuer["id"])
+            record = self._store_code(conn, new_code, role="admin", created_by=issuer.id)
+        invalidate_validate_cache()
         record["plain_code"] = new_code
         return record
 
-    def deactivate_code(self, actor_code: str, target_code: str) -> dict:
+    def deactivate_code(self, actor_code: str, target_code: str) -> CodeRecord:
         """
         Deactivate a target code. Only a master_admin (actor) may perform this action.
         """
-        self._validate_active_code(actor_code, required_role="master_admin")
-        target = self._validate_active_code(target_code)
+        actor_row = self._lookup_code(actor_code)
+        try:
+            target_row = self._lookup_code(target_code)
+        except ManagementCodeError:
+            self._check_code(
+                actor_row, self._verify(actor_code, actor_row), required_role="master_admin"
+            )
+            raise
+        if actor_row is None:
+            raise InvalidCode("Code is not recognized.")
+        # The target's PBKDF2 runs on the KDF pool while this thread verifies the actor.
+        target_verified: Optional[Future[bool]] = None
+        if target_row is not None:
+            target_verified = verify_code_async(
+                target_code, target_row["code_salt"], target_row["code_hash"]
+            )
+        try:
+            self._check_code(
+                actor_row, self._verify(actor_code, actor_row), required_role="master_admin"
+            )
+        except ManagementCodeError:
+            if target_verified is not None:
+                target_verified.cancel()
+            raise
+        target = self._check_code(
+            target_row, target_verified is not None and target_verified.result()
+        )
         with get_connection() as conn:
             conn.execute(
-                "UPDATE management_codes SET is_active = 0 WHERE id = ?", (target["id"],)
+                "UPDATE management_codes SET is_active = 0 WHERE id = ?", (target.id,)
             )
-        target["is_active"] = 0
-        return target
+        invalidate_validate_cache()
+        return replace(target, is_active=0)
 
-    def validate_code(self, code: str) -> dict:
-        """Validate any active code and return its metadata."""
-        return self._validate_active_code(code)
+    def validate_code(self, code: str) -> CodeRecord:
+        """
+        Validate any active code and return its metadata.
+        Outcomes, including rejections, are cached briefly so repeat checks skip PBKDF2.
+        """
+        self._assert_format(code)
+        key = _validate_cache_key(code)
+        now = time.monotonic()
+        with _validate_cache_lock:
+            cached = _validate_cache.get(key)
+            if cached is not None and cached[0] > now:
+                _validate_cache.move_to_end(key)
+                result = cached[1]
+            else:
+                result = None
+            generation = _validate_cache_generation
+        if result is None:
+            try:
+                # The format was already asserted above, before the cache lookup.
+                row = self._fetch_code_row(code)
+                result = self._check_code(row, self._verify(code, row))
+            except InvalidCode as exc:
+                result = str(exc)
+            with _validate_cache_lock:
+                if generation == _validate_cache_generation:
+                    _validate_cache[key] = (now + VALIDATE_CACHE_TTL_SECONDS, result)
+                    _validate_cache.move_to_end(key)
+                    if len(_validate_cache) > VALIDATE_CACHE_MAXSIZE:
+                        _validate_cache.popitem(last=False)
+        if isinstance(result, str):
+            raise InvalidCode(result)
+        return result
 
     def _generate_unique_code(self) -> str:
         """Generate a unique code that fits the 8-16 length requirement."""
@@ -92,25 +203,43 @@ class ManagementCodeService:
             if row is None:
                 return candidate
 
-    def _validate_active_code(self, code: str, required_role: Optional[str] = None) -> dict:
+    def _validate_active_code(
+        self, code: str, required_role: Optional[str] = None
+    ) -> CodeRecord:
         """
         Ensure the code exists, is active, and optionally matches the required role.
         Raises InvalidCode or PermissionDenied upon failure.
         """
+        row = self._lookup_code(code)
+        return self._check_code(row, self._verify(code, row), required_role=required_role)
+
+    def _lookup_code(self, code: str) -> Any:
+        """Assert a code's format, then fetch its stored row, or None."""
         self._assert_format(code)
+        return self._fetch_code_row(code)
+
+    @staticmethod
+    def _fetch_code_row(code: str) -> Any:
+        """Fetch the stored row for an already format-checked code, or None."""
         fp = fingerprint(code)
         with get_connection() as conn:
-            row = conn.execute(
-                "SELECT * FROM management_codes WHERE code_fingerprint = ?", (fp,)
-            ).fetchone()
+            return conn.execute(ACTIVE_CODE_QUERY, (fp,)).fetchone()
+
+    @staticmethod
+    def _verify(code: str, row: Any) -> bool:
+        """PBKDF2-check a code against its row on the calling thread."""
+        return row is not None and verify_code(code, row["code_salt"], row["code_hash"])
 
-        if row is None or not verify_code(code, row["code_salt"], row["code_hash"]):
+    @staticmethod
+    def _check_code(row: Any, verified: bool, required_role: Optional[str] = None) -> CodeRecord:
+        """Apply the validation rules to a looked-up row and its verification result."""
+        if row is None or not verified:
             raise InvalidCode("Code is not recognized.")
         if not row["is_active"]:
             raise InvalidCode("Code is inactive.")
         if required_role and row["role"] != required_role:
             raise PermissionDenied("Insufficient role.")
-        return dict(row)
+        return CodeRecord(*row)
 
     def _store_code(
         self, conn, code: str, role: str, created_by: Optional[int]
@@ -127,17 +256,18 @@ class ManagementCodeService:
             (hashed, salt, fp, role, created_by),
         )
         conn.commit()
-        record = conn.execute(
-            "SELECT * FROM management_codes WHERE id = ?", (cur.lastrowid,)
-        ).fetchone()
+        record = conn.execute(STORED_CODE_QUERY, (cur.lastrowid,)).fetchone()
         return dict(record)
 
     def _assert_format(self, code: str) -> None:
         """Ensure the code follows length/character constraints."""
         if not (MIN_LENGTH <= len(code) <= MAX_LENGTH):
             raise ManagementCodeError("Code must be 8-16 characters.")
-        invalid = [c for c in code if c not in ALLOWED_CHARS]
-        if invalid:
+        encoded = code.encode("ascii", "ignore")
+        if len(encoded) != len(code) or encoded.translate(None, _ALLOWED_BYTES):
             raise ManagementCodeError("Code must be alphanumeric or hyphen.")
-        if not any(c.isalpha() for c in code) or not any(c.isdigit() for c in code):
+        if (
+            len(encoded.translate(None, _LETTER_BYTES)) == len(encoded)
+            or len(encoded.translate(None, _DIGIT_BYTES)) == len(encoded)
+        ):
             raise ManagementCodeError("Code must include both letters and digits.")
@@ -4,18 +4,61 @@ Network utilities for CIDR checks.
 
 from __future__ import annotations
 
+import bisect
 import ipaddress
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Iterable
 
+_START = itemgetter(0)
 
-def is_ip_in_cidrs(ip: str, cidrs: list[str]) -> bool:
-    try:
-        address = ipaddress.ip_address(ip)
-    except ValueError:
-        return False
+
+@dataclass(frozen=True)
+class CidrSet:
+    """Allowed networks split by IP family as sorted, merged (start, end) integer ranges."""
+
+    v4_networks: tuple[tuple[int, int], ...] = ()
+    v6_networks: tuple[tuple[int, int], ...] = ()
+
+
+def _merge(ranges: list[tuple[int, int]]) -> tuple[tuple[int, int], ...]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+            continue
+        merged.append((start, end))
+    return tuple(merged)
+
+
+def compile_cidrs(cidrs: Iterable[str]) -> CidrSet:
+    """Parse CIDR strings once; invalid entries are skipped as in is_ip_in_cidrs."""
+    v4: list[tuple[int, int]] = []
+    v6: list[tuple[int, int]] = []
     for cidr in cidrs:
         try:
-            if address in ipaddress.ip_network(cidr, strict=False):
-                return True
+            network = ipaddress.ip_network(cidr, strict=False)
         except ValueError:
             continue
-    return False
+        table = v4 if network.version == 4 else v6
+        table.append((int(network.network_address), int(network.broadcast_address)))
+    return CidrSet(v4_networks=_merge(v4), v6_networks=_merge(v6))
+
+
+def is_ip_in_networks(ip: str, networks: CidrSet) -> bool:
+    """Check an address against CIDRs already compiled with compile_cidrs."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    table = networks.v4_networks if address.version == 4 else networks.v6_networks
+    value = int(address)
+    index = bisect.bisect_right(table, value, key=_START) - 1
+    return index >= 0 and value <= table[index][1]
+
+
+def is_ip_in_cidrs(ip: str, cidrs: CidrSet | list[str]) -> bool:
+    if not isinstance(cidrs, CidrSet):
+        cidrs = compile_cidrs(cidrs)
+    return is_ip_in_networks(ip, cidrs)
@@ -5,20 +5,74 @@ Token helpers for notification QR codes.
 from __future__ import annotations
 
 import base64
+import functools
 import hashlib
 import hmac
 import json
+import struct
 import time
+import uuid
 from typing import Any
 
+TOKEN_VERSION_PREFIX = "v3."
+V2_TOKEN_PREFIX = "v2."
 
-def _base64url(data: bytes) -> str:
-    return base64.urlsafe_b64encode(data).decode("utf-8").rstrip("=")
+# v3 body: token_id and thread_id as raw UUID bytes, exp, then the UTF-8 child_id;
+# the 16-byte keyed BLAKE2b tag is appended and the whole thing base64url-encoded once.
+_V3_HEADER = struct.Struct("!16s16sI")
+_V3_TAG_SIZE = 16
+_V3_PERSON = b"notify-qr-v3"
 
+_B64ENC = base64.urlsafe_b64encode
+_B64DEC = base64.urlsafe_b64decode
 
-def _base64url_decode(data: str) -> bytes:
-    padding = "=" * (-len(data) % 4)
-    return base64.urlsafe_b64decode(data + padding)
+
+def _b64url(data: bytes) -> bytes:
+    return _B64ENC(data).rstrip(b"=")
+
+
+def _b64url_decode(data: bytes) -> bytes:
+    # The decoder ignores surplus padding, so there is no need to compute it.
+    return _B64DEC(data + b"==")
+
+
+@functools.lru_cache(maxsize=8)
+def _get_secret(secret: str) -> bytes:
+    return secret.encode("utf-8")
+
+
+@functools.lru_cache(maxsize=8)
+def _get_blake2b_key(secret: str) -> bytes:
+    # Keyed BLAKE2b takes at most 64 key bytes; longer secrets are hashed down first,
+    # the way HMAC does with keys longer than its block size.
+    key = _get_secret(secret)
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        key = hashlib.blake2b(key, digest_size=hashlib.blake2b.MAX_KEY_SIZE).digest()
+    return key
+
+
+def _sign(payload_b64: bytes, secret: str) -> bytes:
+    # BLAKE2b has native keying, so no HMAC ipad/opad construction is needed.
+    return hashlib.blake2b(payload_b64, key=_get_blake2b_key(secret), digest_size=32).digest()
+
+
+def _sign_v3(body: bytes, secret: str) -> bytes:
+    return hashlib.blake2b(
+        body, key=_get_blake2b_key(secret), digest_size=_V3_TAG_SIZE, person=_V3_PERSON
+    ).digest()
+
+
+def _uuid_bytes(value: str) -> bytes | None:
+    """Raw bytes of a canonical lowercase UUID string, or None if it would not round-trip."""
+    try:
+        parsed = uuid.UUID(value)
+    except ValueError:
+        return None
+    return parsed.bytes if str(parsed) == value else None
+
+
+def _sign_legacy(payload_b64: bytes, secret: str) -> bytes:
+    return hmac.new(_get_secret(secret), payload_b64, hashlib.sha256).digest()
 
 
 def generate_notify_token(
@@ -29,28 +83,66 @@ def generate_notify_token(
     ttl_seconds: int,
     secret: str,
 ) -> str:
+    exp = int(time.time()) + ttl_seconds
+    token_bytes = _uuid_bytes(token_id)
+    thread_bytes = _uuid_bytes(thread_id)
+    if token_bytes and thread_bytes and child_id:
+        body = _V3_HEADER.pack(token_bytes, thread_bytes, exp) + child_id.encode("utf-8")
+        return TOKEN_VERSION_PREFIX + _b64url(body + _sign_v3(body, secret)).decode("ascii")
+    # IDs that are not UUIDs do not fit the packed layout; fall back to the v2 JSON form.
     payload = {
         "token_id": token_id,
         "thread_id": thread_id,
         "child_id": child_id,
-        "exp": int(time.time()) + ttl_seconds,
+        "exp": exp,
+    }
+    payload_b64 = _b64url(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = _b64url(_sign(payload_b64, secret))
+    return V2_TOKEN_PREFIX + (payload_b64 + b"." + signature).decode("ascii")
+
+
+def _verify_v3(token: str, secret: str) -> dict[str, Any]:
+    try:
+        raw = _b64url_decode(token.encode("ascii"))
+    except (UnicodeEncodeError, ValueError) as exc:
+        raise ValueError("Invalid token format") from exc
+    if len(raw) <= _V3_HEADER.size + _V3_TAG_SIZE:
+        raise ValueError("Invalid token format")
+    body, tag = raw[:-_V3_TAG_SIZE], raw[-_V3_TAG_SIZE:]
+    if not hmac.compare_digest(_sign_v3(body, secret), tag):
+        raise ValueError("Invalid token signature")
+    token_bytes, thread_bytes, exp = _V3_HEADER.unpack_from(body)
+    if exp < int(time.time()):
+        raise ValueError("Token expired")
+    try:
+        child_id = body[_V3_HEADER.size:].decode("utf-8")
+    except UnicodeDecodeError as exc:
+        raise ValueError("Missing token claims") from exc
+    return {
+        "token_id": str(uuid.UUID(bytes=token_bytes)),
+        "thread_id": str(uuid.UUID(bytes=thread_bytes)),
+        "child_id": child_id,
+        "exp": exp,
     }
-    payload_b64 = _base64url(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
-    signature = hmac.new(secret.encode("utf-8"), payload_b64.encode("utf-8"), hashlib.sha256).digest()
-    return f"{payload_b64}.{_base64url(signature)}"
 
 
 def verify_notify_token(token: str, *, secret: str) -> dict[str, Any]:
+    if token.startswith(TOKEN_VERSION_PREFIX):
+        return _verify_v3(token[len(TOKEN_VERSION_PREFIX):], secret)
+    if token.startswith(V2_TOKEN_PREFIX):
+        token = token[len(V2_TOKEN_PREFIX):]
+        sign = _sign
+    else:
+        # Tokens issued before v2 are HMAC-SHA256 signed.
+        sign = _sign_legacy
     try:
-        payload_b64, sig_b64 = token.split(".", 1)
-    except ValueError as exc:
+        payload_b64, sig_b64 = token.encode("ascii").split(b".", 1)
+    except (UnicodeEncodeError, ValueError) as exc:
         raise ValueError("Invalid token format") from exc
-    expected_sig = hmac.new(
-        secret.encode("utf-8"), payload_b64.encode("utf-8"), hashlib.sha256
-    ).digest()
-    if not hmac.compare_digest(_base64url(expected_sig), sig_b64):
+    expected_sig = _b64url(sign(payload_b64, secret))
+    if not hmac.compare_digest(expected_sig, sig_b64):
         raise ValueError("Invalid token signature")
-    payload = json.loads(_base64url_decode(payload_b64))
+    payload = json.loads(_b64url_decode(payload_b64))
     if int(payload.get("exp", 0)) < int(time.time()):
         raise ValueError("Token expired")
     if not payload.get("token_id") or not payload.get("thread_id") or not payload.get("child_id"):
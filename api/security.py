@@ -8,10 +8,14 @@ import base64
 import hashlib
 import hmac
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Tuple
 
 PBKDF2_ITERATIONS = 200_000
 
+# hashlib.pbkdf2_hmac releases the GIL, so verifications on this pool run on separate cores.
+_KDF_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="kdf")
+
 
 def _b64encode(data: bytes) -> str:
     return base64.b64encode(data).decode("utf-8")
@@ -39,6 +43,11 @@ def verify_code(code: str, salt_b64: str, hash_b64: str) -> bool:
     return hmac.compare_digest(expected, computed)
 
 
+def verify_code_async(code: str, salt_b64: str, hash_b64: str) -> Future[bool]:
+    """Run verify_code on the shared KDF pool and return its Future."""
+    return _KDF_POOL.submit(verify_code, code, salt_b64, hash_b64)
+
+
 def fingerprint(code: str) -> str:
     """
     A deterministic SHA256 fingerprint used solely to enforce uniqueness
@@ -12,8 +12,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(
             json.dumps({
                 "is_valid": True,
-                "role": record["role"],
-                "is_active": bool(record["is_active"])
+                "role": record.role,
+                "is_active": bool(record.is_active)
             }),
             mimetype="application/json",
             status_code=200
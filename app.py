@@ -4,19 +4,38 @@ FastAPI application exposing management code issuance and validation APIs.
 
 from __future__ import annotations
 
+import asyncio
+import bisect
 import datetime as dt
+import functools
+import hmac
 import json
+import logging
 import os
 import secrets
+import shutil
 import urllib.parse
 import uuid
-from typing import Any
-
-import requests
-
-from fastapi import Body, Depends, FastAPI, File, Form, HTTPException, Request, Response, UploadFile, status
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
-from pydantic import BaseModel
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from html import escape
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+import orjson
+
+from fastapi import BackgroundTasks, Body, Depends, FastAPI, File, Form, HTTPException, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    ORJSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
+from pydantic import BaseModel, ValidationError
 
 from api.admin_service import (
     AdminAuthError,
@@ -25,11 +44,11 @@ from api.admin_service import (
     AdminLocked,
     WifiLocalSettingsService,
 )
-from api.apps_service import AppsService
+from api.apps_service import AppAsset, AppsService
 from api.fastapi_settings_service import FastApiSettingsService
-from api.local_data_service import LocalDatasetService
-from api.network_utils import is_ip_in_cidrs
-from api.guardian_auth import SessionManager
+from api.local_data_service import LocalDatasetRecord, LocalDatasetService
+from api.network_utils import CidrSet, compile_cidrs, is_ip_in_networks
+from api.guardian_auth import Session, SessionManager
 from api.guardian_service import GuardianService
 from api.login_management_service import LoginManagementService
 from api.line_messaging import (
@@ -48,12 +67,12 @@ from api.line_messaging import (
     get_line_users_for_child,
     mark_comment_request,
     parse_postback,
-    push_message,
+    push_message_async,
     record_event_response,
-    record_message_delivery,
-    record_statement_delivery,
+    record_message_delivery_bulk,
+    record_statement_delivery_bulk,
     register_unlinked_user,
-    reply_message,
+    reply_message_async,
     update_statement_reply,
     verify_signature,
 )
@@ -67,64 +86,237 @@ from api.management import (
 from api.database import init_db
 
 import qrcode
-from qrcode.image.svg import SvgImage
 
-app = FastAPI(title="Management Code Service")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(application: FastAPI) -> AsyncIterator[None]:
+    # Shared keep-alive client for outbound probes; avoids a TCP/TLS handshake per call.
+    application.state.http_client = httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        timeout=5.0,
+    )
+    # LINE push fan-out multiplexes recipients over one HTTP/2 connection.
+    application.state.line_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+    try:
+        yield
+    finally:
+        application.state.http_client.close()
+        await application.state.line_client.aclose()
+
 
+class _JSONResponse(ORJSONResponse):
+    """ORJSONResponse that falls back to the json module for integers wider than 64 bits."""
 
+    def render(self, content: Any) -> bytes:
+        try:
+            return super().render(content)
+        except orjson.JSONEncodeError:
+            return json.dumps(
+                content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8")
+
+
+app = FastAPI(title="Management Code Service", default_response_class=_JSONResponse, lifespan=lifespan)
+
+
+@functools.lru_cache(maxsize=32)
 def _load_static_html(filename: str) -> str:
+    # Pages ship with the app, so each file is read once per process.
     base_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(base_dir, filename)
     with open(file_path, encoding="utf-8") as handle:
         return handle.read()
 
 
+_QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+# Byte-mode capacity of versions 1-40 at _QR_ERROR_CORRECTION: the bit budget minus the
+# 4-bit mode indicator and the version's length field. Index + 1 is the version.
+_QR_BYTE_CAPACITY = tuple(
+    (
+        qrcode.util.BIT_LIMIT_TABLE[_QR_ERROR_CORRECTION][version]
+        - 4
+        - qrcode.util.length_in_bits(qrcode.util.MODE_8BIT_BYTE, version)
+    )
+    // 8
+    for version in range(1, 41)
+)
+
+
+def _qr_version_for(data: bytes) -> int:
+    """Smallest version that holds data as a single byte-mode segment (what best_fit finds)."""
+    version = bisect.bisect_left(_QR_BYTE_CAPACITY, len(data)) + 1
+    if version > 40:
+        raise qrcode.exceptions.DataOverflowError()
+    return version
+
+
+@functools.lru_cache(maxsize=64)
+def _qr_svg_header(size: int, box_size: int) -> str:
+    physical = f"{size * box_size / 10:g}mm"
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{physical}" height="{physical}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges"><path d="'
+    )
+
+
+def _render_qr_svg(url: str, *, border: int, box_size: int = 6) -> bytes:
+    """
+    Render a QR code as one SVG <path>, merging each row's dark modules into runs.
+    The viewBox is in modules; width/height keep SvgImage's box_size/10 mm sizing.
+    """
+    data = url.encode("utf-8")
+    qr = qrcode.QRCode(
+        version=_qr_version_for(data),
+        error_correction=_QR_ERROR_CORRECTION,
+        border=border,
+        box_size=box_size,
+    )
+    # One byte-mode segment so the version from the capacity table is exact.
+    qr.add_data(data, optimize=0)
+    qr.make(fit=False)
+    matrix = qr.get_matrix()
+    parts: list[str] = []
+    for y, row in enumerate(matrix):
+        x = 0
+        width = len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            run = x - start
+            parts.append(f"M{start} {y}h{run}v1h-{run}z")
+    return (_qr_svg_header(len(matrix), box_size) + "".join(parts) + '"/></svg>').encode("ascii")
+
+
+@functools.lru_cache(maxsize=256)
+def _render_app_qr_svg(url: str) -> bytes:
+    # App QR URLs depend only on the host and app key, so they repeat; notify QR URLs carry
+    # a fresh token every time and call _render_qr_svg directly.
+    return _render_qr_svg(url, border=1)
+
+
+class _AppFileResponse(FileResponse):
+    """FileResponse that hands the path to the server when it supports ASGI pathsend."""
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if (
+            self.stat_result is None
+            or scope["method"].upper() == "HEAD"
+            or "http.response.pathsend" not in scope.get("extensions", {})
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        # The server sends the file itself (e.g. sendfile(2)), so no bytes pass through Python.
+        await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+        if self.background is not None:
+            await self.background()
+
+
+@functools.lru_cache(maxsize=256)
+def _app_file_headers(
+    path: str, stat_result: os.stat_result, filename: str | None, media_type: str | None
+) -> tuple[tuple[bytes, bytes], ...]:
+    # Stored files are never rewritten in place, so (path, stat) pins the headers.
+    return tuple(
+        _AppFileResponse(path, filename=filename, media_type=media_type, stat_result=stat_result).raw_headers
+    )
+
+
+def _app_file_response(
+    request: Request,
+    service: AppsService,
+    asset: AppAsset,
+    *,
+    filename: str | None = None,
+    media_type: str | None = None,
+) -> Response:
+    """Serve an uploaded app file; HEAD gets the cached headers without building a FileResponse."""
+    stat_result = service.file_stat(asset)
+    if request.method == "HEAD":
+        response = Response()
+        response.raw_headers = list(_app_file_headers(asset.storage_path, stat_result, filename, media_type))
+        return response
+    return _AppFileResponse(asset.storage_path, filename=filename, media_type=media_type, stat_result=stat_result)
+
+
+# Providers are cached so each process builds its services and session managers once;
+# the services keep no per-request state.
+@functools.cache
 def get_service() -> ManagementCodeService:
     return ManagementCodeService()
 
 
+@functools.cache
 def get_guardian_service() -> GuardianService:
     return GuardianService()
 
 
+@functools.cache
 def get_session_manager() -> SessionManager:
     secret = os.environ.get("SESSION_SECRET", "dev-session-secret")
     return SessionManager(secret=secret)
 
 
+@functools.cache
 def get_admin_session_manager() -> SessionManager:
     secret = os.environ.get("ADMIN_SESSION_SECRET", os.environ.get("SESSION_SECRET", "dev-admin-secret"))
     return SessionManager(secret=secret, cookie_name="admin_session", max_age_seconds=8 * 60 * 60)
 
 
+@functools.cache
 def get_admin_auth_service() -> AdminAuthService:
     return AdminAuthService()
 
 
+@functools.cache
 def get_wifi_settings_service() -> WifiLocalSettingsService:
     return WifiLocalSettingsService()
 
 
+@functools.cache
 def get_fastapi_settings_service() -> FastApiSettingsService:
     return FastApiSettingsService()
 
 
+@functools.cache
 def get_apps_service() -> AppsService:
     return AppsService()
 
 
+@functools.cache
 def get_local_dataset_service() -> LocalDatasetService:
     return LocalDatasetService()
 
 
+@functools.cache
 def get_login_management_service() -> LoginManagementService:
     return LoginManagementService()
 
 
+def _decode_session(request: Request, manager: SessionManager) -> Session:
+    """Decode a session cookie at most once per request, whichever helper asks first."""
+    sessions = getattr(request.state, "sessions", None)
+    if sessions is None:
+        sessions = request.state.sessions = {}
+    session = sessions.get(manager.cookie_name)
+    if session is None:
+        session = sessions[manager.cookie_name] = manager.decode(request.cookies.get(manager.cookie_name))
+    return session
+
+
 def _session_or_401(
     request: Request, manager: SessionManager
 ) -> dict[str, Any]:
-    session = manager.decode(request.cookies.get(manager.cookie_name))
+    session = _decode_session(request, manager)
     user_id = session.get("user_id")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login required")
@@ -134,7 +326,7 @@ def _session_or_401(
 def _admin_session_or_401(
     request: Request, manager: SessionManager
 ) -> dict[str, Any]:
-    session = manager.decode(request.cookies.get(manager.cookie_name))
+    session = _decode_session(request, manager)
     admin_id = session.get("admin_id")
     if not admin_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Admin login required")
@@ -150,6 +342,59 @@ def _admin_session_or_403(
     return session
 
 
+# async so FastAPI runs them inline instead of handing a cookie check to the threadpool.
+async def require_guardian_session(
+    request: Request, manager: SessionManager = Depends(get_session_manager)
+) -> dict[str, Any]:
+    return _session_or_401(request, manager)
+
+
+async def require_admin_session(
+    request: Request, manager: SessionManager = Depends(get_admin_session_manager)
+) -> dict[str, Any]:
+    return _admin_session_or_403(request, manager)
+
+
+@functools.lru_cache(maxsize=16)
+def _redirect_raw_headers(location: str) -> tuple[tuple[bytes, bytes], ...]:
+    return tuple(RedirectResponse(location).raw_headers)
+
+
+def _redirect(location: str) -> Response:
+    """
+    302 to one of the app's fixed paths. The quoted Location header is built once per
+    path; each call still gets its own header list, since set/delete_cookie append to it.
+    """
+    response = Response(status_code=status.HTTP_302_FOUND)
+    response.raw_headers = list(_redirect_raw_headers(location))
+    return response
+
+
+_ADMIN_PAGE_REDIRECTS = {"login": "/admin/login", "change_pw": "/admin/change-password"}
+
+
+def _resolve_admin_session(
+    request: Request, manager: SessionManager
+) -> tuple[str, dict[str, Any]]:
+    """Decode the admin cookie once: ("login", {}), ("change_pw", {}) or ("ok", session)."""
+    session = _decode_session(request, manager)
+    if not session.get("admin_id"):
+        return "login", {}
+    if session.get("must_change_password"):
+        return "change_pw", {}
+    return "ok", session
+
+
+def _accepts_json(request: Request) -> bool:
+    """Whether the Accept header asks for JSON; decided once per request."""
+    cached = getattr(request.state, "accepts_json", None)
+    if cached is None:
+        accept = request.headers.get("accept")
+        cached = accept is not None and "application/json" in accept
+        request.state.accepts_json = cached
+    return cached
+
+
 def _client_ip(request: Request) -> str | None:
     forwarded = request.headers.get("x-forwarded-for") or request.headers.get("X-Forwarded-For")
     if forwarded:
@@ -159,6 +404,11 @@ def _client_ip(request: Request) -> str | None:
     return None
 
 
+@functools.lru_cache(maxsize=4096)
+def _cidr_check(ip: str, networks: CidrSet) -> bool:
+    return is_ip_in_networks(ip, networks)
+
+
 def _enforce_local_access(request: Request, settings: dict[str, Any]) -> None:
     if not settings.get("enabled"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Local access disabled")
@@ -168,19 +418,63 @@ def _enforce_local_access(request: Request, settings: dict[str, Any]) -> None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unknown client")
     if client_ip in ("127.0.0.1", "::1"):
         return
-    if allowed_cidrs and not is_ip_in_cidrs(client_ip, allowed_cidrs):
+    if allowed_cidrs and not _cidr_check(client_ip, _allowed_networks(settings)):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Outside allowed network")
 
 
+def _allowed_networks(settings: dict[str, Any]) -> CidrSet:
+    networks = settings.get("allowed_networks")
+    if networks is None:
+        networks = compile_cidrs(settings.get("allowed_cidr_list") or [])
+    return networks
+
+
+def _dataset_etag(dataset_id: str, updated_at: str) -> str:
+    return f'W/"{dataset_id}:{updated_at}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 13.1.2): the W/ prefix is ignored on both sides.
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+async def _iter_chunks(chunks: tuple[bytes, ...]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _iter_history_json(records: list[LocalDatasetRecord]) -> AsyncIterator[bytes]:
+    yield b'{"count":%d,"records":[' % len(records)
+    separator = b""
+    for record in records:
+        yield separator + orjson.dumps(
+            {
+                "id": record.id,
+                "version_label": record.version_label,
+                "updated_at": record.updated_at,
+                "updated_by": record.updated_by,
+            }
+        )
+        separator = b","
+    yield b"]}"
+
+
 def _enforce_local_mode(settings: dict[str, Any]) -> None:
     if not settings.get("local_mode"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Local mode disabled")
 
 
 def _require_local_token(request: Request, settings: dict[str, Any]) -> None:
-    token = request.headers.get("X-Local-Token", "")
-    expected = settings.get("shared_token")
-    if not expected or not secrets.compare_digest(token, expected):
+    token = request.headers.get("X-Local-Token", "").encode("utf-8")
+    expected = (settings.get("shared_token") or "").encode("utf-8")
+    # Compare even when no token is configured so both failures take the same path.
+    matched = hmac.compare_digest(token, expected)
+    if not expected or not matched:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid local token")
 
 
@@ -199,47 +493,75 @@ def _parse_line_template(payload: dict[str, Any]) -> list[dict[str, Any]]:
     return []
 
 
+_LineMessages = tuple[list[dict[str, Any]], str | None, str | None]
+
+
+def _build_statement_messages(message_payload: dict[str, Any]) -> _LineMessages:
+    statement = StatementPayload(
+        statement_id=str(message_payload["statement_id"]),
+        nursery_name=str(message_payload["nursery_name"]),
+        target_month=str(message_payload["target_month"]),
+        total_amount=str(message_payload["total_amount"]),
+    )
+    return [build_statement_flex(statement)], statement.statement_id, None
+
+
+def _build_event_messages(message_payload: dict[str, Any]) -> _LineMessages:
+    event = EventPayload(
+        event_id=str(message_payload["event_id"]),
+        title=str(message_payload["title"]),
+        date=str(message_payload["date"]),
+    )
+    return [build_event_flex(event)], None, event.event_id
+
+
+def _build_template_messages(message_payload: dict[str, Any]) -> _LineMessages:
+    messages = _parse_line_template(message_payload)
+    if not messages:
+        raise ValueError("template payload requires messages.")
+    return messages, None, None
+
+
+# message_type -> (keys that must be present and truthy, error message, builder).
+_LINE_MESSAGE_HANDLERS: dict[
+    str, tuple[frozenset[str], str, Callable[[dict[str, Any]], _LineMessages]]
+] = {
+    "statement": (
+        frozenset({"statement_id", "nursery_name", "target_month", "total_amount"}),
+        "statement payload requires statement_id, nursery_name, target_month, total_amount.",
+        _build_statement_messages,
+    ),
+    "event": (
+        frozenset({"event_id", "title", "date"}),
+        "event payload requires event_id, title, date.",
+        _build_event_messages,
+    ),
+    "template": (frozenset(), "", _build_template_messages),
+}
+
+
 def _build_line_messages(
     message_type: str,
     message_payload: dict[str, Any],
-) -> tuple[list[dict[str, Any]], str | None, str | None]:
-    if message_type == "statement":
-        required = ["statement_id", "nursery_name", "target_month", "total_amount"]
-        if not all(message_payload.get(key) for key in required):
-            raise ValueError("statement payload requires statement_id, nursery_name, target_month, total_amount.")
-        statement = StatementPayload(
-            statement_id=str(message_payload["statement_id"]),
-            nursery_name=str(message_payload["nursery_name"]),
-            target_month=str(message_payload["target_month"]),
-            total_amount=str(message_payload["total_amount"]),
-        )
-        return [build_statement_flex(statement)], statement.statement_id, None
-    if message_type == "event":
-        required = ["event_id", "title", "date"]
-        if not all(message_payload.get(key) for key in required):
-            raise ValueError("event payload requires event_id, title, date.")
-        event = EventPayload(
-            event_id=str(message_payload["event_id"]),
-            title=str(message_payload["title"]),
-            date=str(message_payload["date"]),
-        )
-        return [build_event_flex(event)], None, event.event_id
-    if message_type == "template":
-        messages = _parse_line_template(message_payload)
-        if not messages:
-            raise ValueError("template payload requires messages.")
-        return messages, None, None
-    raise ValueError("Invalid message_type.")
+) -> _LineMessages:
+    handler = _LINE_MESSAGE_HANDLERS.get(message_type)
+    if handler is None:
+        raise ValueError("Invalid message_type.")
+    required, error, build = handler
+    if required and required.difference(key for key, value in message_payload.items() if value):
+        raise ValueError(error)
+    return build(message_payload)
 
 
-def _handle_line_follow(event: dict[str, Any]) -> None:
+async def _handle_line_follow(client: httpx.AsyncClient, event: dict[str, Any]) -> None:
     line_user_id = extract_user_id(event)
     if not line_user_id:
         return
-    register_unlinked_user(line_user_id)
+    await run_in_threadpool(register_unlinked_user, line_user_id)
     reply_token = extract_reply_token(event)
     if reply_token:
-        reply_message(
+        await reply_message_async(
+            client,
             reply_token,
             [
                 {
@@ -292,6 +614,20 @@ def _handle_line_postback(event: dict[str, Any]) -> None:
         record_event_response(value, line_user_id, status="absent", child_key=child_key)
 
 
+async def _dispatch_line_event(client: httpx.AsyncClient, event: dict[str, Any]) -> None:
+    # Runs after the webhook has been acknowledged, so failures are logged rather than raised.
+    try:
+        event_type = event.get("type")
+        if event_type == "follow":
+            await _handle_line_follow(client, event)
+        elif event_type == "message":
+            await run_in_threadpool(_handle_line_message, event)
+        elif event_type == "postback":
+            await run_in_threadpool(_handle_line_postback, event)
+    except Exception:
+        logger.exception("Failed to handle LINE webhook event")
+
+
 class CodeRequest(BaseModel):
     code: str
 
@@ -350,10 +686,36 @@ class LocalDatasetPayload(BaseModel):
     updated_at: str | None = None
 
 
+# /save and /sync read the body themselves; this keeps it documented in the OpenAPI schema.
+_LOCAL_DATASET_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": LocalDatasetPayload.model_json_schema()}},
+    }
+}
+
+
+async def _read_local_dataset(request: Request) -> LocalDatasetPayload:
+    # model_validate_json parses and validates in one pass inside pydantic-core,
+    # skipping the intermediate dict FastAPI would build with json.loads.
+    try:
+        return LocalDatasetPayload.model_validate_json(await request.body())
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+        )
+
+
 class LoginManagementPayload(BaseModel):
     entries: list[dict[str, Any]] = []
 
 
+class LineNotifyRequest(BaseModel):
+    child_id: str
+    message_type: str
+    payload: dict[str, Any] = {}
+
+
 def _handle_error(err: ManagementCodeError) -> HTTPException:
     if isinstance(err, PermissionDenied):
         return HTTPException(
@@ -406,7 +768,7 @@ def deactivate_code(
         record = service.deactivate_code(payload.actor_code, payload.target_code)
     except ManagementCodeError as err:
         raise _handle_error(err)
-    return {"id": record["id"], "is_active": bool(record["is_active"])}
+    return {"id": record.id, "is_active": bool(record.is_active)}
 
 
 @app.post("/codes/validate", response_model=ValidationResponse)
@@ -420,7 +782,7 @@ def validate_code(
         return ValidationResponse(is_valid=False, role=None, is_active=None)
     except ManagementCodeError as err:
         raise _handle_error(err)
-    return ValidationResponse(is_valid=True, role=record["role"], is_active=bool(record["is_active"]))
+    return ValidationResponse(is_valid=True, role=record.role, is_active=bool(record.is_active))
 
 
 @app.post("/admin/auth/login")
@@ -464,6 +826,7 @@ def admin_logout(
 @app.post("/admin/auth/change-password")
 def admin_change_password(
     request: Request,
+    response: Response,
     payload: AdminChangePasswordRequest,
     auth_service: AdminAuthService = Depends(get_admin_auth_service),
     session_manager: SessionManager = Depends(get_admin_session_manager),
@@ -473,14 +836,13 @@ def admin_change_password(
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Password too short")
     auth_service.change_password(session["admin_id"], payload.new_password)
     session["must_change_password"] = False
-    response = Response(content=json.dumps({"status": "ok"}), media_type="application/json")
     response.set_cookie(
         session_manager.cookie_name,
         session_manager.encode(session),
         httponly=True,
         samesite="lax",
     )
-    return response
+    return {"status": "ok"}
 
 
 @app.get("/admin/settings/wifi-local")
@@ -489,15 +851,12 @@ def get_wifi_local_settings(
     session_manager: SessionManager = Depends(get_admin_session_manager),
     service: WifiLocalSettingsService = Depends(get_wifi_settings_service),
 ):
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
-    if not session.get("admin_id"):
-        return RedirectResponse("/admin/login", status_code=status.HTTP_302_FOUND)
-    if session.get("must_change_password"):
-        return RedirectResponse("/admin/change-password", status_code=status.HTTP_302_FOUND)
+    state, _ = _resolve_admin_session(request, session_manager)
+    if state != "ok":
+        return _redirect(_ADMIN_PAGE_REDIRECTS[state])
     accepts = request.headers.get("accept", "")
     if "text/html" in accepts and "application/json" not in accepts:
         return HTMLResponse(content=_load_static_html("admin-wifi-local.html"))
-    _admin_session_or_403(request, session_manager)
     return service.get_settings()
 
 
@@ -506,11 +865,9 @@ def admin_local_ops_page(
     request: Request,
     session_manager: SessionManager = Depends(get_admin_session_manager),
 ):
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
-    if not session.get("admin_id"):
-        return RedirectResponse("/admin/login", status_code=status.HTTP_302_FOUND)
-    if session.get("must_change_password"):
-        return RedirectResponse("/admin/change-password", status_code=status.HTTP_302_FOUND)
+    state, _ = _resolve_admin_session(request, session_manager)
+    if state != "ok":
+        return _redirect(_ADMIN_PAGE_REDIRECTS[state])
     return HTMLResponse(content=_load_static_html("admin-local-ops.html"))
 
 
@@ -520,17 +877,16 @@ def get_fastapi_local_settings(
     session_manager: SessionManager = Depends(get_admin_session_manager),
     service: FastApiSettingsService = Depends(get_fastapi_settings_service),
 ):
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
-    if not session.get("admin_id"):
-        return RedirectResponse("/admin/login", status_code=status.HTTP_302_FOUND)
-    if session.get("must_change_password"):
-        return RedirectResponse("/admin/change-password", status_code=status.HTTP_302_FOUND)
-    _admin_session_or_403(request, session_manager)
+    state, _ = _resolve_admin_session(request, session_manager)
+    if state != "ok":
+        return _redirect(_ADMIN_PAGE_REDIRECTS[state])
     settings = service.get_settings()
+    networks = _allowed_networks(settings)
+    settings.pop("allowed_networks", None)
     client_ip = _client_ip(request)
     allowed = True
     if client_ip and settings.get("allowed_cidr_list"):
-        allowed = is_ip_in_cidrs(client_ip, settings.get("allowed_cidr_list") or [])
+        allowed = is_ip_in_networks(client_ip, networks)
     settings["client_ip"] = client_ip
     settings["client_allowed"] = allowed
     return settings
@@ -538,23 +894,21 @@ def get_fastapi_local_settings(
 
 @app.put("/admin/settings/fastapi-local")
 def update_fastapi_local_settings(
-    request: Request,
     payload: FastApiSettingsPayload,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: FastApiSettingsService = Depends(get_fastapi_settings_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
-    updated = service.update_settings(session["admin_id"], payload.model_dump())
+    updated = service.update_settings(session["admin_id"], dict(payload))
+    updated.pop("allowed_networks", None)
+    _cidr_check.cache_clear()
     return updated
 
 
 @app.post("/admin/settings/fastapi-local/regenerate-token")
 def regenerate_fastapi_token(
-    request: Request,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: FastApiSettingsService = Depends(get_fastapi_settings_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
     current = service.get_settings()
     current["shared_token"] = service.regenerate_token()
     updated = service.update_settings(session["admin_id"], current)
@@ -568,37 +922,30 @@ def get_login_management_entries(
     return {"entries": service.get_entries()}
 
 
-@app.get("/admin/settings/login-management")
+@app.get("/admin/settings/login-management", dependencies=[Depends(require_admin_session)])
 def get_admin_login_management_entries(
-    request: Request,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
     service: LoginManagementService = Depends(get_login_management_service),
 ):
-    _admin_session_or_403(request, session_manager)
     return {"entries": service.get_entries()}
 
 
 @app.post("/admin/settings/login-management")
 def update_admin_login_management_entries(
-    request: Request,
     payload: LoginManagementPayload,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: LoginManagementService = Depends(get_login_management_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
     entries = service.update_entries(session["admin_id"], payload.entries)
     return {"entries": entries}
 
 
 @app.put("/admin/settings/wifi-local")
 def update_wifi_local_settings(
-    request: Request,
     payload: WifiLocalSettingsPayload,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: WifiLocalSettingsService = Depends(get_wifi_settings_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
-    updated = service.update_settings(session["admin_id"], payload.model_dump())
+    updated = service.update_settings(session["admin_id"], dict(payload))
     service.log_audit(session["admin_id"], "WIFI_LOCAL_UPDATED", {"site_id": updated.get("site_id")})
     return updated
 
@@ -606,19 +953,18 @@ def update_wifi_local_settings(
 @app.post("/admin/settings/wifi-local/test-connection")
 def test_wifi_local_connection(
     request: Request,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: WifiLocalSettingsService = Depends(get_wifi_settings_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
     settings = service.get_settings()
     base_url = settings.get("local_api_base_url")
     ok = False
     reason = "unreachable"
     try:
-        res = requests.get(f"{base_url.rstrip('/')}/health", timeout=5)
+        res = request.app.state.http_client.get(f"{base_url.rstrip('/')}/health")
         ok = res.status_code < 400
         reason = "ok" if ok else "bad_status"
-    except requests.RequestException:
+    except (httpx.RequestError, httpx.InvalidURL):
         ok = False
         reason = "unreachable"
     service.log_audit(
@@ -644,25 +990,38 @@ def local_health(
 
 
 @app.get("/latest")
-def get_latest_dataset(
+async def get_latest_dataset(
     request: Request,
     fastapi_service: FastApiSettingsService = Depends(get_fastapi_settings_service),
     dataset_service: LocalDatasetService = Depends(get_local_dataset_service),
 ):
-    settings = fastapi_service.get_settings()
+    settings = await run_in_threadpool(fastapi_service.get_settings)
     _enforce_local_access(request, settings)
     if settings.get("require_latest_token"):
         _require_local_token(request, settings)
-    latest = dataset_service.get_latest()
+    version = await run_in_threadpool(dataset_service.get_latest_version)
+    if not version:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No data")
+    etag = _dataset_etag(*version)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    latest = await run_in_threadpool(dataset_service.get_latest_raw)
     if not latest:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No data")
-    return {
-        "id": latest.id,
-        "version_label": latest.version_label,
-        "updated_at": latest.updated_at,
-        "updated_by": latest.updated_by,
-        "payload": latest.payload,
-    }
+    envelope = orjson.dumps(
+        {
+            "id": latest.id,
+            "version_label": latest.version_label,
+            "updated_at": latest.updated_at,
+            "updated_by": latest.updated_by,
+        }
+    )
+    # Splice the stored payload bytes into the envelope instead of decoding and re-encoding them.
+    return StreamingResponse(
+        _iter_chunks((envelope[:-1], b',"payload":', latest.payload_json, b"}")),
+        media_type="application/json",
+        headers={"ETag": _dataset_etag(latest.id, latest.updated_at)},
+    )
 
 
 @app.get("/history")
@@ -674,34 +1033,24 @@ def get_dataset_history(
 ):
     settings = fastapi_service.get_settings()
     _enforce_local_access(request, settings)
-    records = dataset_service.list_history(limit=limit)
-    return {
-        "count": len(records),
-        "records": [
-            {
-                "id": record.id,
-                "version_label": record.version_label,
-                "updated_at": record.updated_at,
-                "updated_by": record.updated_by,
-            }
-            for record in records
-        ],
-    }
+    records = dataset_service.list_history(limit=limit, with_payload=False)
+    return StreamingResponse(_iter_history_json(records), media_type="application/json")
 
 
-@app.post("/save")
-def save_dataset(
+@app.post("/save", openapi_extra=_LOCAL_DATASET_BODY)
+async def save_dataset(
     request: Request,
-    payload: LocalDatasetPayload,
     fastapi_service: FastApiSettingsService = Depends(get_fastapi_settings_service),
     dataset_service: LocalDatasetService = Depends(get_local_dataset_service),
 ):
-    settings = fastapi_service.get_settings()
+    settings = await run_in_threadpool(fastapi_service.get_settings)
     _enforce_local_access(request, settings)
     _enforce_local_mode(settings)
     if settings.get("require_save_token"):
         _require_local_token(request, settings)
-    record = dataset_service.save_dataset(
+    payload = await _read_local_dataset(request)
+    record = await run_in_threadpool(
+        dataset_service.save_dataset,
         payload=payload.payload,
         version_label=payload.version_label,
         updated_by=payload.updated_by,
@@ -716,19 +1065,20 @@ def save_dataset(
     }
 
 
-@app.post("/sync")
-def sync_dataset(
+@app.post("/sync", openapi_extra=_LOCAL_DATASET_BODY)
+async def sync_dataset(
     request: Request,
-    payload: LocalDatasetPayload,
     fastapi_service: FastApiSettingsService = Depends(get_fastapi_settings_service),
     dataset_service: LocalDatasetService = Depends(get_local_dataset_service),
 ):
-    settings = fastapi_service.get_settings()
+    settings = await run_in_threadpool(fastapi_service.get_settings)
     _enforce_local_access(request, settings)
     _enforce_local_mode(settings)
     if settings.get("require_sync_token"):
         _require_local_token(request, settings)
-    record = dataset_service.save_dataset(
+    payload = await _read_local_dataset(request)
+    record = await run_in_threadpool(
+        dataset_service.save_dataset,
         payload=payload.payload,
         version_label=payload.version_label,
         updated_by=payload.updated_by,
@@ -744,12 +1094,12 @@ def sync_dataset(
 
 
 @app.post("/line/notify")
-def send_line_notification(
+async def send_line_notification(
     request: Request,
     payload: LineNotifyRequest,
     fastapi_service: FastApiSettingsService = Depends(get_fastapi_settings_service),
 ):
-    settings = fastapi_service.get_settings()
+    settings = await run_in_threadpool(fastapi_service.get_settings)
     _enforce_local_access(request, settings)
     if settings.get("require_sync_token"):
         _require_local_token(request, settings)
@@ -762,74 +1112,79 @@ def send_line_notification(
         messages, statement_id, event_id = _build_line_messages(message_type, message_payload)
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-    line_user_ids = get_line_users_for_child(str(child_id))
+    line_user_ids = await run_in_threadpool(get_line_users_for_child, str(child_id))
     if not line_user_ids:
         return {"ok": True, "results": [], "detail": "No LINE users linked."}
+    client = request.app.state.line_client
+    outcomes = await asyncio.gather(
+        *(push_message_async(client, line_user_id, messages) for line_user_id in line_user_ids),
+        return_exceptions=True,
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, LineMessagingConfigError):
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(outcome)) from outcome
+        if isinstance(outcome, BaseException) and not isinstance(outcome, LineMessagingRequestError):
+            raise outcome
     results = []
-    for line_user_id in line_user_ids:
-        status_label = "sent"
-        try:
-            push_message(line_user_id, messages)
-        except LineMessagingRequestError:
-            status_label = "failed"
-        except LineMessagingConfigError as exc:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)) from exc
-        record_message_delivery(
-            message_type=message_type,
-            child_key=str(child_id),
-            line_user_id=line_user_id,
-            status=status_label,
-            payload=message_payload,
-            statement_id=statement_id,
-            event_id=event_id,
+    message_rows = []
+    statement_rows = []
+    for line_user_id, outcome in zip(line_user_ids, outcomes):
+        status_label = "failed" if isinstance(outcome, LineMessagingRequestError) else "sent"
+        message_rows.append(
+            {
+                "message_type": message_type,
+                "child_key": str(child_id),
+                "line_user_id": line_user_id,
+                "status": status_label,
+                "payload": message_payload,
+                "statement_id": statement_id,
+                "event_id": event_id,
+            }
         )
         if message_type == "statement":
-            record_statement_delivery(
-                statement_id=str(statement_id),
-                child_key=str(child_id),
-                line_user_id=line_user_id,
-                status=status_label,
+            statement_rows.append(
+                {
+                    "statement_id": str(statement_id),
+                    "child_key": str(child_id),
+                    "line_user_id": line_user_id,
+                    "status": status_label,
+                }
             )
         results.append({"line_user_id": line_user_id, "status": status_label})
+    await run_in_threadpool(record_message_delivery_bulk, message_rows)
+    if statement_rows:
+        await run_in_threadpool(record_statement_delivery_bulk, statement_rows)
     return {"ok": True, "results": results}
 
 
 @app.post("/line/webhook")
-async def handle_line_webhook(request: Request) -> JSONResponse:
+async def handle_line_webhook(request: Request, background_tasks: BackgroundTasks) -> JSONResponse:
     try:
         raw_body = await request.body()
         signature = request.headers.get("X-Line-Signature", "")
         channel_secret = _line_channel_secret()
         if not verify_signature(raw_body, signature, channel_secret):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature.")
-        payload = await request.json()
-    except (ValueError, json.JSONDecodeError):
+        payload = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON payload.")
     except LineMessagingConfigError as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)) from exc
 
-    events = payload.get("events", [])
-    for event in events:
-        event_type = event.get("type")
-        if event_type == "follow":
-            _handle_line_follow(event)
-        elif event_type == "message":
-            _handle_line_message(event)
-        elif event_type == "postback":
-            _handle_line_postback(event)
+    # Acknowledge immediately; LINE retries deliveries whose ACK is slow.
+    client = request.app.state.line_client
+    for event in payload.get("events", []):
+        background_tasks.add_task(_dispatch_line_event, client, event)
     return JSONResponse({"ok": True})
 
 
-@app.get("/admin/apps")
-def list_admin_apps(
-    request: Request,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+@app.get("/admin/apps", dependencies=[Depends(require_admin_session)])
+async def list_admin_apps(
     service: AppsService = Depends(get_apps_service),
     auth_service: AdminAuthService = Depends(get_admin_auth_service),
 ):
-    _admin_session_or_403(request, session_manager)
-    apps = service.list_latest()
-    admin_cache: dict[str, str] = {}
+    apps = await run_in_threadpool(service.list_latest)
+    admins = await run_in_threadpool(auth_service.get_admins, {app.updated_by_admin_id for app in apps})
     return {
         "items": [
             {
@@ -838,10 +1193,7 @@ def list_admin_apps(
                 "filename": app.filename,
                 "version_label": app.version_label,
                 "updated_at": app.updated_at,
-                "updated_by": admin_cache.setdefault(
-                    app.updated_by_admin_id,
-                    (auth_service.get_admin(app.updated_by_admin_id) or {}).get("username", app.updated_by_admin_id),
-                ),
+                "updated_by": admins.get(app.updated_by_admin_id, {}).get("username", app.updated_by_admin_id),
                 "is_latest": app.is_latest,
             }
             for app in apps
@@ -849,91 +1201,99 @@ def list_admin_apps(
     }
 
 
-@app.get("/admin/apps/{app_key}/latest")
+@app.get(
+    "/admin/apps/{app_key}/latest",
+    response_model=None,
+    dependencies=[Depends(require_admin_session)],
+)
 def get_admin_app_latest(
-    request: Request,
     app_key: str,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
     service: AppsService = Depends(get_apps_service),
     auth_service: AdminAuthService = Depends(get_admin_auth_service),
 ):
-    _admin_session_or_403(request, session_manager)
     app = service.get_latest(app_key)
     if not app:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
     admin_name = (auth_service.get_admin(app.updated_by_admin_id) or {}).get("username", app.updated_by_admin_id)
-    return {
-        "app_key": app.app_key,
-        "app_name": app.app_name,
-        "filename": app.filename,
-        "version_label": app.version_label,
-        "updated_at": app.updated_at,
-        "updated_by": admin_name,
-        "is_latest": app.is_latest,
-        "download_url": f"/admin/apps/{app.app_key}/download",
-        "public_url": f"/apps/{app.app_key}/latest",
-    }
+    return ORJSONResponse(
+        {
+            "app_key": app.app_key,
+            "app_name": app.app_name,
+            "filename": app.filename,
+            "version_label": app.version_label,
+            "updated_at": app.updated_at,
+            "updated_by": admin_name,
+            "is_latest": app.is_latest,
+            "download_url": f"/admin/apps/{app.app_key}/download",
+            "public_url": f"/apps/{app.app_key}/latest",
+        }
+    )
 
 
-@app.get("/admin/apps/{app_key}/download")
+@app.get("/admin/apps/{app_key}/download", dependencies=[Depends(require_admin_session)])
+@app.head(
+    "/admin/apps/{app_key}/download",
+    include_in_schema=False,
+    dependencies=[Depends(require_admin_session)],
+)
 def download_admin_app(
     request: Request,
     app_key: str,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
     service: AppsService = Depends(get_apps_service),
 ):
-    _admin_session_or_403(request, session_manager)
     app = service.get_latest(app_key)
     if not app:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
-    return FileResponse(app.storage_path, filename=app.filename)
+    return _app_file_response(request, service, app, filename=app.filename)
 
 
-@app.get("/admin/apps/{app_key}/qr")
+@app.get("/admin/apps/{app_key}/qr", dependencies=[Depends(require_admin_session)])
 def get_admin_app_qr(
     request: Request,
     app_key: str,
-    session_manager: SessionManager = Depends(get_admin_session_manager),
     service: AppsService = Depends(get_apps_service),
 ):
-    _admin_session_or_403(request, session_manager)
     app = service.get_latest(app_key)
     if not app:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
     url = f"{request.base_url}apps/{app.app_key}/latest"
-    qr = qrcode.QRCode(border=1, box_size=6)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(image_factory=SvgImage)
-    return Response(content=img.to_string(), media_type="image/svg+xml")
+    return Response(content=_render_app_qr_svg(url), media_type="image/svg+xml")
+
+
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 @app.post("/admin/apps/{app_key}/upload")
 async def upload_admin_app(
-    request: Request,
     app_key: str,
     file: UploadFile = File(...),
     app_name: str = Form(...),
-    session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     service: AppsService = Depends(get_apps_service),
     auth_service: AdminAuthService = Depends(get_admin_auth_service),
 ):
-    session = _admin_session_or_403(request, session_manager)
     admin_name = (auth_service.get_admin(session["admin_id"]) or {}).get("username", session["admin_id"])
-    content = await file.read()
     if not file.filename or not file.filename.lower().endswith(".html"):
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="HTML only")
+    # Copy the spooled upload to a staging file in chunks and rename it into place,
+    # rather than holding the whole body in memory.
+    staging = service.open_staging_file()
     try:
-        record = service.save_upload(
+        with staging:
+            await run_in_threadpool(shutil.copyfileobj, file.file, staging, _UPLOAD_CHUNK_SIZE)
+        record = service.save_upload_from_path(
             app_key=app_key,
             app_name=app_name,
             filename=file.filename,
-            content=content,
+            source_path=staging.name,
             admin_id=session["admin_id"],
             updated_by_label=admin_name,
         )
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(staging.name)
     return {
         "app_key": record.app_key,
         "app_name": record.app_name,
@@ -946,25 +1306,92 @@ async def upload_admin_app(
 
 
 @app.get("/apps/{app_key}/latest")
+@app.head("/apps/{app_key}/latest", include_in_schema=False)
 def serve_app_latest(
+    request: Request,
     app_key: str,
     service: AppsService = Depends(get_apps_service),
 ):
     app = service.get_latest(app_key)
     if not app:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
-    return FileResponse(app.storage_path, media_type="text/html")
+    return _app_file_response(request, service, app, media_type="text/html")
 
 
 @app.get("/apps/{app_key}/download")
+@app.head("/apps/{app_key}/download", include_in_schema=False)
 def download_app_latest(
+    request: Request,
     app_key: str,
     service: AppsService = Depends(get_apps_service),
 ):
     app = service.get_latest(app_key)
     if not app:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
-    return FileResponse(app.storage_path, filename=app.filename)
+    return _app_file_response(request, service, app, filename=app.filename)
+
+
+_ADMIN_LOGIN_PAGE = """\
+<html lang="ja">
+  <head>
+    <meta charset="UTF-8" />
+    <title>Admin Login</title>
+    <style>
+      body { font-family: sans-serif; padding: 32px; background: #f6f7fb; }
+      .card { max-width: 420px; margin: 0 auto; background: #fff; padding: 24px; border-radius: 12px; box-shadow: 0 8px 24px rgba(0,0,0,0.08); }
+      label { display: block; margin-top: 12px; }
+      input { width: 100%; padding: 10px; margin-top: 6px; border-radius: 8px; border: 1px solid #ccc; }
+      button { margin-top: 16px; width: 100%; padding: 12px; border: none; border-radius: 8px; background: #275efe; color: #fff; font-weight: bold; }
+      .error { color: #b00020; margin-top: 12px; }
+      .info { margin-top: 16px; padding: 12px; border-radius: 10px; background: #f0f4ff; border: 1px solid #d6e2ff; font-size: 13px; }
+      .info code { background: #fff; padding: 2px 6px; border-radius: 6px; }
+      .info ul { margin: 8px 0 0; padding-left: 18px; }
+    </style>
+  </head>
+  <body>
+    <div class="card">
+      <h1>管理者ログイン</h1>
+      <label>ユーザーID</label>
+      <input id="username" autocomplete="username" />
+      <label>パスワード</label>
+      <input id="password" type="password" autocomplete="current-password" />
+      <button onclick="login()">ログイン</button>
+      <div id="error" class="error"></div>
+      <div class="info">
+        <strong>現在の管理情報</strong>
+        <ul>
+          <li>管理ID: <code>admin</code></li>
+          <li>管理PW: <code>admin01</code></li>
+          <li>管理コード (初期マスター): <code>administration012345</code></li>
+        </ul>
+        <div>変更済みの場合は最新の情報を使用してください。</div>
+      </div>
+    </div>
+    <script>
+      async function login() {
+        const username = document.getElementById('username').value;
+        const password = document.getElementById('password').value;
+        const res = await fetch('/admin/auth/login', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ username, password })
+        });
+        if (!res.ok) {
+          const data = await res.json().catch(() => ({}));
+          document.getElementById('error').textContent = data.detail || 'ログインに失敗しました';
+          return;
+        }
+        const data = await res.json();
+        if (data.must_change_password) {
+          window.location.href = '/admin/change-password';
+        } else {
+          window.location.href = '/admin/local-ops';
+        }
+      }
+    </script>
+  </body>
+</html>
+""".encode("utf-8")
 
 
 @app.get("/admin/login")
@@ -972,73 +1399,55 @@ def admin_login_page(
     request: Request,
     session_manager: SessionManager = Depends(get_admin_session_manager),
 ):
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     if session.get("admin_id"):
         if session.get("must_change_password"):
-            return RedirectResponse("/admin/change-password", status_code=status.HTTP_302_FOUND)
-        return RedirectResponse("/admin/local-ops", status_code=status.HTTP_302_FOUND)
-    html = """
-    <html lang="ja">
-      <head>
-        <meta charset="UTF-8" />
-        <title>Admin Login</title>
-        <style>
-          body { font-family: sans-serif; padding: 32px; background: #f6f7fb; }
-          .card { max-width: 420px; margin: 0 auto; background: #fff; padding: 24px; border-radius: 12px; box-shadow: 0 8px 24px rgba(0,0,0,0.08); }
-          label { display: block; margin-top: 12px; }
-          input { width: 100%; padding: 10px; margin-top: 6px; border-radius: 8px; border: 1px solid #ccc; }
-          button { margin-top: 16px; width: 100%; padding: 12px; border: none; border-radius: 8px; background: #275efe; color: #fff; font-weight: bold; }
-          .error { color: #b00020; margin-top: 12px; }
-          .info { margin-top: 16px; padding: 12px; border-radius: 10px; background: #f0f4ff; border: 1px solid #d6e2ff; font-size: 13px; }
-          .info code { background: #fff; padding: 2px 6px; border-radius: 6px; }
-          .info ul { margin: 8px 0 0; padding-left: 18px; }
-        </style>
-      </head>
-      <body>
-        <div class="card">
-          <h1>管理者ログイン</h1>
-          <label>ユーザーID</label>
-          <input id="username" autocomplete="username" />
-          <label>パスワード</label>
-          <input id="password" type="password" autocomplete="current-password" />
-          <button onclick="login()">ログイン</button>
-          <div id="error" class="error"></div>
-          <div class="info">
-            <strong>現在の管理情報</strong>
-            <ul>
-              <li>管理ID: <code>admin</code></li>
-              <li>管理PW: <code>admin01</code></li>
-              <li>管理コード (初期マスター): <code>administration012345</code></li>
-            </ul>
-            <div>変更済みの場合は最新の情報を使用してください。</div>
-          </div>
-        </div>
-        <script>
-          async function login() {
-            const username = document.getElementById('username').value;
-            const password = document.getElementById('password').value;
-            const res = await fetch('/admin/auth/login', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ username, password })
-            });
-            if (!res.ok) {
-              const data = await res.json().catch(() => ({}));
-              document.getElementById('error').textContent = data.detail || 'ログインに失敗しました';
-              return;
-            }
-            const data = await res.json();
-            if (data.must_change_password) {
-              window.location.href = '/admin/change-password';
-            } else {
-              window.location.href = '/admin/local-ops';
-            }
-          }
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+            return _redirect("/admin/change-password")
+        return _redirect("/admin/local-ops")
+    return HTMLResponse(content=_ADMIN_LOGIN_PAGE)
+
+
+_ADMIN_CHANGE_PASSWORD_PAGE = """\
+<html lang="ja">
+  <head>
+    <meta charset="UTF-8" />
+    <title>パスワード変更</title>
+    <style>
+      body { font-family: sans-serif; padding: 32px; background: #f6f7fb; }
+      .card { max-width: 480px; margin: 0 auto; background: #fff; padding: 24px; border-radius: 12px; box-shadow: 0 8px 24px rgba(0,0,0,0.08); }
+      input { width: 100%; padding: 10px; margin-top: 6px; border-radius: 8px; border: 1px solid #ccc; }
+      button { margin-top: 16px; width: 100%; padding: 12px; border: none; border-radius: 8px; background: #275efe; color: #fff; font-weight: bold; }
+      .error { color: #b00020; margin-top: 12px; }
+    </style>
+  </head>
+  <body>
+    <div class="card">
+      <h1>初回パスワード変更</h1>
+      <p>初回ログインのためパスワード変更が必須です。</p>
+      <label>新しいパスワード</label>
+      <input id="new-password" type="password" autocomplete="new-password" />
+      <button onclick="changePassword()">変更する</button>
+      <div id="error" class="error"></div>
+    </div>
+    <script>
+      async function changePassword() {
+        const newPassword = document.getElementById('new-password').value;
+        const res = await fetch('/admin/auth/change-password', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ new_password: newPassword })
+        });
+        if (!res.ok) {
+          const data = await res.json().catch(() => ({}));
+          document.getElementById('error').textContent = data.detail || '変更に失敗しました';
+          return;
+        }
+        window.location.href = '/admin/local-ops';
+      }
+    </script>
+  </body>
+</html>
+""".encode("utf-8")
 
 
 @app.get("/admin/change-password")
@@ -1046,53 +1455,12 @@ def admin_change_password_page(
     request: Request,
     session_manager: SessionManager = Depends(get_admin_session_manager),
 ):
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     if not session.get("admin_id"):
-        return RedirectResponse("/admin/login", status_code=status.HTTP_302_FOUND)
+        return _redirect("/admin/login")
     if not session.get("must_change_password"):
-        return RedirectResponse("/admin/local-ops", status_code=status.HTTP_302_FOUND)
-    html = """
-    <html lang="ja">
-      <head>
-        <meta charset="UTF-8" />
-        <title>パスワード変更</title>
-        <style>
-          body { font-family: sans-serif; padding: 32px; background: #f6f7fb; }
-          .card { max-width: 480px; margin: 0 auto; background: #fff; padding: 24px; border-radius: 12px; box-shadow: 0 8px 24px rgba(0,0,0,0.08); }
-          input { width: 100%; padding: 10px; margin-top: 6px; border-radius: 8px; border: 1px solid #ccc; }
-          button { margin-top: 16px; width: 100%; padding: 12px; border: none; border-radius: 8px; background: #275efe; color: #fff; font-weight: bold; }
-          .error { color: #b00020; margin-top: 12px; }
-        </style>
-      </head>
-      <body>
-        <div class="card">
-          <h1>初回パスワード変更</h1>
-          <p>初回ログインのためパスワード変更が必須です。</p>
-          <label>新しいパスワード</label>
-          <input id="new-password" type="password" autocomplete="new-password" />
-          <button onclick="changePassword()">変更する</button>
-          <div id="error" class="error"></div>
-        </div>
-        <script>
-          async function changePassword() {
-            const newPassword = document.getElementById('new-password').value;
-            const res = await fetch('/admin/auth/change-password', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ new_password: newPassword })
-            });
-            if (!res.ok) {
-              const data = await res.json().catch(() => ({}));
-              document.getElementById('error').textContent = data.detail || '変更に失敗しました';
-              return;
-            }
-            window.location.href = '/admin/local-ops';
-          }
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+        return _redirect("/admin/local-ops")
+    return HTMLResponse(content=_ADMIN_CHANGE_PASSWORD_PAGE)
 
 
 class SmsStartRequest(BaseModel):
@@ -1119,14 +1487,50 @@ class NotifyMessageRequest(BaseModel):
     body_text: str
 
 
-class LineNotifyRequest(BaseModel):
-    child_id: str
-    message_type: str
-    payload: dict[str, Any] = {}
+@dataclass(slots=True, frozen=True)
+class _RuntimeCfg:
+    """Guardian auth/QR settings read from the environment once per process."""
+
+    sms_pepper: str
+    sms_ttl: int
+    sms_max_tries: int
+    sms_debug_code: str | None
+    qr_token_ttl: int
+    qr_token_secret: str
+    oauth_stub_mode: bool
+
+    @classmethod
+    def from_env(cls) -> _RuntimeCfg:
+        return cls(
+            sms_pepper=os.environ.get("SMS_PEPPER", "dev-sms-pepper"),
+            sms_ttl=int(os.environ.get("SMS_TTL", "300")),
+            sms_max_tries=int(os.environ.get("SMS_MAX_TRIES", "5")),
+            sms_debug_code=os.environ.get("SMS_DEBUG_CODE"),
+            qr_token_ttl=int(os.environ.get("QR_TOKEN_TTL", "900")),
+            qr_token_secret=os.environ.get("QR_TOKEN_SECRET", "dev-qr-secret"),
+            oauth_stub_mode=bool(os.environ.get("OAUTH_STUB_MODE")),
+        )
+
+
+_runtime_cfg: _RuntimeCfg | None = None
+
+
+def get_runtime_cfg() -> _RuntimeCfg:
+    global _runtime_cfg
+    if _runtime_cfg is None:
+        _runtime_cfg = _RuntimeCfg.from_env()
+    return _runtime_cfg
+
+
+def reload_runtime_cfg() -> _RuntimeCfg:
+    """Re-read the environment, e.g. after a test changes it."""
+    global _runtime_cfg
+    _runtime_cfg = _RuntimeCfg.from_env()
+    return _runtime_cfg
 
 
 def _sms_pepper() -> str:
-    return os.environ.get("SMS_PEPPER", "dev-sms-pepper")
+    return get_runtime_cfg().sms_pepper
 
 
 def _mask_label(label: str) -> str:
@@ -1137,13 +1541,33 @@ def _mask_label(label: str) -> str:
     return f"{label[0]}*{label[-1]}"
 
 
+_LI_PRE = "<li><strong>"
+_LI_MID = "</strong>: "
+_LI_POST = "</li>"
+
+
+_NO_MESSAGES_ITEM = "<li>メッセージがありません。</li>".encode("utf-8")
+
+
+def _render_message_items(messages: list[dict[str, Any]]) -> bytes:
+    # Message bodies are user input; escape them so they render as text.
+    if not messages:
+        return _NO_MESSAGES_ITEM
+    return "".join(
+        [
+            _LI_PRE + escape(msg["sender_type"]) + _LI_MID + escape(msg["body_text"]) + _LI_POST
+            for msg in messages
+        ]
+    ).encode("utf-8")
+
+
 @app.get("/login")
 def guardian_login_page() -> HTMLResponse:
     html = _load_static_html("guardian-login.html")
     return HTMLResponse(content=html)
 
 
-@app.post("/auth/sms/start")
+@app.post("/auth/sms/start", response_model=None)
 def sms_start(
     request: Request,
     payload: SmsStartRequest,
@@ -1159,10 +1583,12 @@ def sms_start(
     if recent >= 3:
         raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests")
 
-    ttl_seconds = int(os.environ.get("SMS_TTL", "300"))
-    tries_left = int(os.environ.get("SMS_MAX_TRIES", "5"))
-    debug_code = os.environ.get("SMS_DEBUG_CODE")
-    code = debug_code or f"{secrets.randbelow(1000000):06d}"
+    cfg = get_runtime_cfg()
+    ttl_seconds = cfg.sms_ttl
+    tries_left = cfg.sms_max_tries
+    debug_code = cfg.sms_debug_code
+    # One CSPRNG read; with 32 bits the modulo bias toward low codes is under 0.03%.
+    code = debug_code or f"{int.from_bytes(secrets.token_bytes(4), 'big') % 1000000:06d}"
     challenge = guardian_service.create_sms_challenge(
         phone_e164=phone_e164,
         code=code,
@@ -1171,20 +1597,22 @@ def sms_start(
         tries_left=tries_left,
         pepper=pepper,
     )
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     if payload.return_to:
         session["return_to"] = payload.return_to
-    response = JSONResponse({"challenge_id": challenge["id"], "ttl_sec": ttl_seconds})
-    response.set_cookie(
-        session_manager.cookie_name,
-        session_manager.encode(session),
-        httponly=True,
-        samesite="lax",
-    )
+    response = ORJSONResponse({"challenge_id": challenge["id"], "ttl_sec": ttl_seconds})
+    # Without return_to the session is untouched; the browser's cookie is still valid as is.
+    if session.dirty:
+        response.set_cookie(
+            session_manager.cookie_name,
+            session_manager.encode(session),
+            httponly=True,
+            samesite="lax",
+        )
     return response
 
 
-@app.post("/auth/sms/verify")
+@app.post("/auth/sms/verify", response_model=None)
 def sms_verify(
     request: Request,
     payload: SmsVerifyRequest,
@@ -1206,11 +1634,11 @@ def sms_verify(
         external_id=external_id,
         display_hint=display_hint,
     )
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     session["user_id"] = user["id"]
     session.pop("oauth_state", None)
     return_to = session.pop("return_to", "/guardian-portal.html")
-    response = JSONResponse({"session_ok": True, "user_id": user["id"], "return_to": return_to})
+    response = ORJSONResponse({"session_ok": True, "user_id": user["id"], "return_to": return_to})
     response.set_cookie(
         session_manager.cookie_name,
         session_manager.encode(session),
@@ -1220,6 +1648,18 @@ def sms_verify(
     return response
 
 
+_PROVIDER_LOGIN_UNAVAILABLE_PAGE = """\
+<html lang="ja">
+  <head><meta charset="UTF-8"><title>ログイン準備中</title></head>
+  <body style="font-family:sans-serif;padding:24px;">
+    <h1>ログイン準備中</h1>
+    <p>このログイン方法は現在準備中です。</p>
+    <a href="/login">ログインへ戻る</a>
+  </body>
+</html>
+""".encode("utf-8")
+
+
 @app.get("/auth/{provider}/login")
 def provider_login(
     provider: str,
@@ -1230,21 +1670,13 @@ def provider_login(
 ):
     if provider not in {"microsoft", "apple", "google", "yahoo"}:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found")
-    if not os.environ.get("OAUTH_STUB_MODE"):
-        html = """
-        <html lang="ja">
-          <head><meta charset="UTF-8"><title>ログイン準備中</title></head>
-          <body style="font-family:sans-serif;padding:24px;">
-            <h1>ログイン準備中</h1>
-            <p>このログイン方法は現在準備中です。</p>
-            <a href="/login">ログインへ戻る</a>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not get_runtime_cfg().oauth_stub_mode:
+        return HTMLResponse(
+            content=_PROVIDER_LOGIN_UNAVAILABLE_PAGE, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     external_id = f"stub-{provider}-{uuid.uuid4()}"
     user = guardian_service.upsert_identity(provider=provider, external_id=external_id, display_hint=None)
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     session["user_id"] = user["id"]
     response = RedirectResponse(return_to or "/guardian-portal.html", status_code=status.HTTP_302_FOUND)
     response.set_cookie(
@@ -1258,11 +1690,17 @@ def provider_login(
 
 @app.post("/auth/logout")
 def logout(session_manager: SessionManager = Depends(get_session_manager)):
-    response = RedirectResponse("/guardian-portal.html", status_code=status.HTTP_302_FOUND)
+    response = _redirect("/guardian-portal.html")
     response.delete_cookie(session_manager.cookie_name)
     return response
 
 
+@functools.cache
+def _guardian_login_path() -> str:
+    # Routes are fixed once the module is loaded, so resolve the path a single time.
+    return app.url_path_for("guardian_login_page")
+
+
 @app.get("/q/notify", name="notify_qr_entry")
 def notify_qr_entry(
     t: str,
@@ -1270,17 +1708,20 @@ def notify_qr_entry(
     session_manager: SessionManager = Depends(get_session_manager),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    secret = os.environ.get("QR_TOKEN_SECRET", "dev-qr-secret")
     try:
-        payload = verify_notify_token(t, secret=secret)
+        payload = verify_notify_token(t, secret=get_runtime_cfg().qr_token_secret)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
 
-    session = session_manager.decode(request.cookies.get(session_manager.cookie_name))
+    session = _decode_session(request, session_manager)
     if not session.get("user_id"):
-        return_to = f"{request.url.path}?t={t}"
-        login_url = app.url_path_for("guardian_login_page") + "?return_to=" + urllib.parse.quote(
-            return_to, safe=""
+        return_to = "".join((request.url.path, "?t=", t))
+        login_url = "".join(
+            (
+                _guardian_login_path(),
+                "?return_to=",
+                urllib.parse.quote_from_bytes(return_to.encode("utf-8"), safe=b""),
+            )
         )
         return RedirectResponse(login_url, status_code=status.HTTP_302_FOUND)
 
@@ -1294,53 +1735,54 @@ def notify_qr_entry(
     return RedirectResponse(f"/notify/{payload['thread_id']}", status_code=status.HTTP_302_FOUND)
 
 
+_NOTIFY_THREAD_PAGE = """\
+<html lang="ja">
+  <head><meta charset="UTF-8"><title>保護者通知</title></head>
+  <body style="font-family:sans-serif;padding:24px;">
+    <h1>保護者通知</h1>
+    <span style="display:inline-block;padding:4px 10px;border-radius:999px;background:#dcfce7;color:#15803d;">連携済み</span>
+    <h2>メッセージ</h2>
+    <ul>%b</ul>
+    <form method="post" action="/notify/%b/reply" style="margin-top:16px;">
+      <textarea name="body_text" rows="4" style="width:100%%;max-width:520px;"></textarea>
+      <br />
+      <button type="submit">返信する</button>
+    </form>
+  </body>
+</html>
+""".encode("utf-8")
+
+
 @app.get("/notify/{thread_id}")
 def notify_thread_page(
     thread_id: str,
-    request: Request,
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
-    thread = guardian_service.get_thread(thread_id)
-    if not thread:
+    view = guardian_service.load_thread_view(
+        thread_id,
+        reader_type="GUARDIAN",
+        reader_id=session["user_id"],
+        link_user_id=session["user_id"],
+    )
+    if not view:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
-    link = guardian_service.get_link(session["user_id"], thread["child_id"])
-    if not link:
+    if not view["link"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not linked")
-    guardian_service.mark_read(thread_id=thread_id, reader_type="GUARDIAN", reader_id=session["user_id"])
-    messages = guardian_service.list_messages(thread_id)
-    list_items = "".join(
-        f"<li><strong>{msg['sender_type']}</strong>: {msg['body_text']}</li>" for msg in messages
-    ) or "<li>メッセージがありません。</li>"
-    html = f"""
-    <html lang="ja">
-      <head><meta charset="UTF-8"><title>保護者通知</title></head>
-      <body style="font-family:sans-serif;padding:24px;">
-        <h1>保護者通知</h1>
-        <span style="display:inline-block;padding:4px 10px;border-radius:999px;background:#dcfce7;color:#15803d;">連携済み</span>
-        <h2>メッセージ</h2>
-        <ul>{list_items}</ul>
-        <form method="post" action="/notify/{thread_id}/reply" style="margin-top:16px;">
-          <textarea name="body_text" rows="4" style="width:100%;max-width:520px;"></textarea>
-          <br />
-          <button type="submit">返信する</button>
-        </form>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    page = _NOTIFY_THREAD_PAGE % (
+        _render_message_items(view["messages"]),
+        escape(thread_id).encode("utf-8"),
+    )
+    return HTMLResponse(content=page)
 
 
 @app.post("/notify/{thread_id}/reply")
 def notify_reply(
     thread_id: str,
-    request: Request,
     body_text: str = Form(""),
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
     thread = guardian_service.get_thread(thread_id)
     if not thread:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
@@ -1362,65 +1804,60 @@ def notify_reply(
 @app.post("/notify/{thread_id}/read")
 def notify_read(
     thread_id: str,
-    request: Request,
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
     guardian_service.mark_read(thread_id=thread_id, reader_type="GUARDIAN", reader_id=session["user_id"])
     return {"status": "ok"}
 
 
+_ADMIN_NOTIFY_THREAD_PAGE = """\
+<html lang="ja">
+  <head><meta charset="UTF-8"><title>園側通知</title></head>
+  <body style="font-family:sans-serif;padding:24px;">
+    <h1>園側通知</h1>
+    <p>職員未読: %d</p>
+    <h2>メッセージ</h2>
+    <ul>%b</ul>
+    <form method="post" action="/admin/notify/threads/%b/send" style="margin-top:16px;">
+      <textarea name="body_text" rows="4" style="width:100%%;max-width:520px;"></textarea>
+      <br />
+      <button type="submit">送信する</button>
+    </form>
+  </body>
+</html>
+""".encode("utf-8")
+
+
 @app.get("/admin/notify/threads/{thread_id}")
 def admin_notify_thread_page(
     thread_id: str,
-    request: Request,
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
-    thread = guardian_service.get_thread(thread_id)
-    if not thread:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
-    staff_unread = guardian_service.get_unread_count(
-        thread_id=thread_id,
+    view = guardian_service.load_thread_view(
+        thread_id,
         reader_type="STAFF",
         reader_id=session["admin_id"],
-        sender_types=["GUARDIAN"],
+        unread_sender_types=["GUARDIAN"],
     )
-    guardian_service.mark_read(thread_id=thread_id, reader_type="STAFF", reader_id=session["admin_id"])
-    messages = guardian_service.list_messages(thread_id)
-    list_items = "".join(
-        f"<li><strong>{msg['sender_type']}</strong>: {msg['body_text']}</li>" for msg in messages
-    ) or "<li>メッセージがありません。</li>"
-    html = f"""
-    <html lang="ja">
-      <head><meta charset="UTF-8"><title>園側通知</title></head>
-      <body style="font-family:sans-serif;padding:24px;">
-        <h1>園側通知</h1>
-        <p>職員未読: {staff_unread}</p>
-        <h2>メッセージ</h2>
-        <ul>{list_items}</ul>
-        <form method="post" action="/admin/notify/threads/{thread_id}/send" style="margin-top:16px;">
-          <textarea name="body_text" rows="4" style="width:100%;max-width:520px;"></textarea>
-          <br />
-          <button type="submit">送信する</button>
-        </form>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    if not view:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
+    page = _ADMIN_NOTIFY_THREAD_PAGE % (
+        view["unread"],
+        _render_message_items(view["messages"]),
+        escape(thread_id).encode("utf-8"),
+    )
+    return HTMLResponse(content=page)
 
 
 @app.post("/admin/notify/threads/{thread_id}/send")
 def admin_notify_send(
     thread_id: str,
-    request: Request,
     body_text: str = Form(""),
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
     thread = guardian_service.get_thread(thread_id)
     if not thread:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
@@ -1439,155 +1876,144 @@ def admin_notify_send(
 @app.post("/admin/notify/threads/{thread_id}/read")
 def admin_notify_read(
     thread_id: str,
-    request: Request,
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
     guardian_service.mark_read(thread_id=thread_id, reader_type="STAFF", reader_id=session["admin_id"])
     return {"status": "ok"}
 
 
-@app.get("/admin/children/{child_id}/notify-state")
-def admin_notify_state(
+@app.get("/admin/children/{child_id}/notify-state", response_model=None)
+async def admin_notify_state(
     child_id: str,
-    request: Request,
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
-    thread = guardian_service.get_thread_by_child(child_id)
+    # The lookups are independent; run each pair concurrently on the threadpool.
+    thread, linked_count = await asyncio.gather(
+        run_in_threadpool(guardian_service.get_thread_by_child, child_id),
+        run_in_threadpool(guardian_service.count_links_for_child, child_id),
+    )
     thread_id = thread["id"] if thread else None
-    linked_count = guardian_service.count_links_for_child(child_id)
     link_status = "LINKED" if linked_count > 0 else "UNLINKED"
     unread_count = 0
     last_message_at = None
     if thread_id:
-        unread_count = guardian_service.get_unread_count(
-            thread_id=thread_id,
-            reader_type="STAFF",
-            reader_id=session["admin_id"],
-            sender_types=["GUARDIAN"],
+        unread_count, last_message_at = await asyncio.gather(
+            run_in_threadpool(
+                guardian_service.get_unread_count,
+                thread_id=thread_id,
+                reader_type="STAFF",
+                reader_id=session["admin_id"],
+                sender_types=["GUARDIAN"],
+            ),
+            run_in_threadpool(guardian_service.get_last_message_at, thread_id),
         )
-        last_message_at = guardian_service.get_last_message_at(thread_id)
-    return {
-        "child_id": child_id,
-        "link_status": link_status,
-        "linked_count": linked_count,
-        "thread_id": thread_id,
-        "unread_count": unread_count,
-        "last_message_at": last_message_at,
-    }
+    return ORJSONResponse(
+        {
+            "child_id": child_id,
+            "link_status": link_status,
+            "linked_count": linked_count,
+            "thread_id": thread_id,
+            "unread_count": unread_count,
+            "last_message_at": last_message_at,
+        }
+    )
 
 
-@app.post("/admin/notify/thread/upsert")
+@app.post("/admin/notify/thread/upsert", response_model=None)
 def admin_notify_thread_upsert(
     payload: NotifyThreadUpsertRequest,
-    request: Request,
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
     thread = guardian_service.upsert_thread(payload.child_id, session["admin_id"])
-    return {"thread_id": thread["id"]}
+    return ORJSONResponse({"thread_id": thread["id"]})
 
 
-@app.post("/admin/notify/qr")
+@app.post("/admin/notify/qr", response_model=None)
 def admin_notify_qr(
     payload: NotifyQrRequest,
     request: Request,
-    admin_session_manager: SessionManager = Depends(get_admin_session_manager),
+    session: dict[str, Any] = Depends(require_admin_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _admin_session_or_403(request, admin_session_manager)
     thread = guardian_service.get_thread(payload.thread_id)
     if not thread or thread["child_id"] != payload.child_id:
         thread = guardian_service.upsert_thread(payload.child_id, session["admin_id"])
-    ttl_seconds = int(os.environ.get("QR_TOKEN_TTL", "900"))
+    cfg = get_runtime_cfg()
+    ttl_seconds = cfg.qr_token_ttl
     token_record = guardian_service.create_qr_token_record(
         thread_id=thread["id"],
         child_id=payload.child_id,
         ttl_seconds=ttl_seconds,
     )
-    secret = os.environ.get("QR_TOKEN_SECRET", "dev-qr-secret")
     token = generate_notify_token(
         token_id=token_record["id"],
         thread_id=thread["id"],
         child_id=payload.child_id,
         ttl_seconds=ttl_seconds,
-        secret=secret,
+        secret=cfg.qr_token_secret,
     )
     url = str(request.url_for("notify_qr_entry")) + f"?t={token}"
-    qr = qrcode.QRCode(border=2, box_size=6)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(image_factory=SvgImage)
-    svg_data = img.to_string()
-    if isinstance(svg_data, bytes):
-        svg_data = svg_data.decode("utf-8")
+    svg_data = _render_qr_svg(url, border=2).decode("utf-8")
     expires_at = token_record["expires_at"]
-    return {
-        "qr_svg": svg_data,
-        "url": url,
-        "expires_at": expires_at,
-    }
+    return ORJSONResponse(
+        {
+            "qr_svg": svg_data,
+            "url": url,
+            "expires_at": expires_at,
+        }
+    )
 
 
-@app.get("/me/links")
+@app.get("/me/links", response_model=None)
 def list_links(
-    request: Request,
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
-    return {"links": guardian_service.get_links(session["user_id"])}
+    return ORJSONResponse({"links": guardian_service.get_links(session["user_id"])})
 
 
-@app.get("/me/badge")
+@app.get("/me/badge", response_model=None)
 def badge(
-    request: Request,
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
     count = guardian_service.count_links(session["user_id"])
-    return {"linked": count > 0, "count": count}
+    return ORJSONResponse({"linked": count > 0, "count": count})
 
 
-@app.get("/me/children")
+_CHILDREN_PAGE = """\
+<html lang="ja">
+  <head><meta charset="UTF-8"><title>紐付け園児一覧</title></head>
+  <body style="font-family:sans-serif;padding:24px;">
+    <h1>紐付け園児一覧</h1>
+    <ul>%b</ul>
+    <a href="/guardian-portal.html">保護者トップへ戻る</a>
+  </body>
+</html>
+""".encode("utf-8")
+_NO_CHILDREN_ITEM = "<li>紐付け済みの園児がありません。</li>".encode("utf-8")
+
+
+@app.get("/me/children", response_model=None)
 def children(
     request: Request,
     format: str | None = None,
-    session_manager: SessionManager = Depends(get_session_manager),
+    session: dict[str, Any] = Depends(require_guardian_session),
     guardian_service: GuardianService = Depends(get_guardian_service),
 ):
-    session = _session_or_401(request, session_manager)
-    children_rows = guardian_service.get_children(session["user_id"])
-    payload = [
-        {
-            "child_id": row["child_id"],
-            "display_label_masked": _mask_label(
-                row.get("display_label") or row.get("external_child_id") or row["child_id"]
-            ),
-        }
-        for row in children_rows
-    ]
-
-    wants_json = format == "json" or "application/json" in request.headers.get("accept", "")
-    if wants_json:
-        return payload
-
-    items = "".join(
-        f"<li>{entry['display_label_masked']}</li>" for entry in payload
-    ) or "<li>紐付け済みの園児がありません。</li>"
-    html = f"""
-    <html lang="ja">
-      <head><meta charset="UTF-8"><title>紐付け園児一覧</title></head>
-      <body style="font-family:sans-serif;padding:24px;">
-        <h1>紐付け園児一覧</h1>
-        <ul>{items}</ul>
-        <a href="/guardian-portal.html">保護者トップへ戻る</a>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    payload = guardian_service.get_children_masked(session["user_id"])
+
+    if format == "json" or _accepts_json(request):
+        return ORJSONResponse(payload)
+
+    items = (
+        "".join(["<li>" + escape(entry["display_label_masked"]) + _LI_POST for entry in payload]).encode(
+            "utf-8"
+        )
+        if payload
+        else _NO_CHILDREN_ITEM
+    )
+    return HTMLResponse(content=_CHILDREN_PAGE % items)
@@ -0,0 +1,39 @@
+import unittest
+import uuid
+
+from api.notify_tokens import (
+    TOKEN_VERSION_PREFIX,
+    V2_TOKEN_PREFIX,
+    generate_notify_token,
+    verify_notify_token,
+)
+
+LONG_SECRET = "s" * 100
+
+
+class NotifyTokenSecretLengthTest(unittest.TestCase):
+    def test_v2_token_with_secret_over_64_bytes(self):
+        # Non-UUID ids fall back to the v2 format.
+        token = generate_notify_token(
+            token_id="token-1", thread_id="thread-1", child_id="child-1", ttl_seconds=60, secret=LONG_SECRET
+        )
+        self.assertTrue(token.startswith(V2_TOKEN_PREFIX))
+        payload = verify_notify_token(token, secret=LONG_SECRET)
+        self.assertEqual(payload["token_id"], "token-1")
+        with self.assertRaises(ValueError):
+            verify_notify_token(token, secret=LONG_SECRET + "x")
+
+    def test_v3_token_with_secret_over_64_bytes(self):
+        token_id, thread_id = str(uuid.uuid4()), str(uuid.uuid4())
+        token = generate_notify_token(
+            token_id=token_id, thread_id=thread_id, child_id="child-1", ttl_seconds=60, secret=LONG_SECRET
+        )
+        self.assertTrue(token.startswith(TOKEN_VERSION_PREFIX))
+        payload = verify_notify_token(token, secret=LONG_SECRET)
+        self.assertEqual((payload["token_id"], payload["thread_id"]), (token_id, thread_id))
+        with self.assertRaises(ValueError):
+            verify_notify_token(token, secret=LONG_SECRET + "x")
+
+
+if __name__ == "__main__":
+    unittest.main()